@@ -7,14 +7,14 @@ Written by:
 
 # Import common packages
 import pandas as pd
-from io import StringIO # For handling new json format in pandas
 import numpy as np
 import os
-import tempfile # For saving as svg
+import time
+from functools import lru_cache
 
 # Import Dash / Plotly Functions
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output, State, callback, no_update
+from dash import Dash, dcc, html, Input, Output, State, callback, no_update, Patch
 from dash import ctx # Used for identifying callback_context
 import dash_bootstrap_components as dbc
 # from dash_extensions.snippets import send_data_frame
@@ -28,13 +28,19 @@ import iaea_data as iaea
 import nuclear_chart_display_types as ncdt
 import level_scheme_display_functions as lsdf
 import hover_nuclear_data as hnd
+from session_store import open_session_store
+from picture_manifest import approved_pictures
+from image_derivatives import image_src, register_routes as register_image_routes
+from chart_export import export_service, EXPORT_FORMATS
+from level_scheme_store import level_scheme_store, known_jp_levels, has_levels
 
-# Uncomment to see layout properties of chosen theme above to set text, background, etc. 
-from dash_bootstrap_templates import load_figure_template
-import plotly.io as pio
 
 # Call ground state information from IAEA
 # ground_state = iaea.NuChartGS() # Since it's a universal dataset which is not modified, it's okay to leave here
+# Load (and freeze) ground state data now so gunicorn --preload shares it between all workers
+iaea.preload_ground_state()
+# Server-side store of the DataFrames used by callbacks, the dcc.Store components only hold keys into it
+sessionStore = open_session_store()
 
 # For finding warnings
 # import warnings
@@ -55,15 +61,6 @@ def oxfordComma(_s):
     *a, b = _s
     return f"{', '.join(map(str, a))}, and {b}"
 
-def collaboratorNames(string_):
-    # Assumes string is the file name of the nucleus
-    names = string_.split('-')[-1] # According to naming convention {A}{sym}_{exc}-{name1};{name2}.png, names is the last part split
-    names = names.split('.')[0] # Eliminate the file type suffix
-    names = names.replace('_',' ')
-    listNames = names.split(';')
-
-    return oxfordComma(listNames)
-
 def getExcitationGroupString(string_):
     # According to naming convention {A}{sym}_{exc}-{name1};{name2}.png, excitation is the middle part
     state = string_.split('-')[0] # Gives {A}{sym}_{exc}
@@ -72,6 +69,23 @@ def getExcitationGroupString(string_):
               2:[2,html.Sup('nd'),' excited state'], 3:[3,html.Sup('rd'),' excited state']}
     return exDict[state]
 
+def levelSchemeMessage(message_):
+    # Empty level scheme figure only showing a (wrapped) message to the user
+    levels = go.Figure()
+    levels.add_trace(go.Scatter(
+        x=[1],
+        y=[1],
+        text=[lsdf.customwrap(message_)],
+        mode="text",
+        hoverinfo='skip',
+        textfont={
+            'color':'white'
+        }
+    ))
+    levels.update_yaxes(showticklabels=False,showgrid=False)
+    levels.update_xaxes(showticklabels=False,showgrid=False)
+    return levels
+
 
 #%%
 # Begin designing dash layout and components of layout
@@ -79,40 +93,12 @@ def getExcitationGroupString(string_):
 theme = dbc.themes.CYBORG
 theme_name = 'cyborg'
 
-load_figure_template(theme_name)
-plotly_template = pio.templates[theme_name]
-plotly_template.layout = {
-    'xaxis': {
-        'titlefont': {
-            'color': 'white',  # Set to a color that's visible on the dark background
-            'size': 16,
-        },
-        'tickfont': {
-            'color': 'white',  # Set to a suitable color
-            'size': 12,
-        },
-    },
-    'yaxis': {
-        'titlefont': {
-            'color': 'white',  # Set to a color that's visible on the dark background
-            'size': 16,
-        },
-        'tickfont': {
-            'color': 'white',  # Set to a suitable color
-            'size': 12,
-        },
-    },
-    'legend': {
-        'font': {
-            'color': 'white'
-        }
-    },
-    'paper_bgcolor': '#292b2c',  # Set the background color to match CYBORG theme
-    'plot_bgcolor': '#292b2c',  # Set the background color to match CYBORG theme
-}
+plotly_template = ncdt.load_app_template(theme_name) # Dark figure layout of the app (also the default template)
 
 app = Dash(__name__,external_stylesheets=[theme])
 server = app.server
+# Resized images (see image_derivatives.py) are served from /img/ and cached by browsers
+register_image_routes(server)
 app.title = 'Interactive Nuclear Chart'
 
 ##########################################################################################
@@ -208,9 +194,27 @@ chart_options = dbc.Offcanvas(
         dbc.Card(
             [
                 ##### Export Options #####
-                dbc.Label('Click to export chart as:'),
-                html.Button("svg", id="btn_svg_download"),
+                dbc.Label('Click to export as:'),
+                dbc.RadioItems(
+                    options=[
+                        {'label':'Nuclear Chart','value':'chart'},
+                        {'label':'Level Scheme','value':'level_scheme'}
+                    ],
+                    value='chart',
+                    id='export_figure',
+                    inline=True
+                ),
+                dbc.RadioItems(
+                    options=[{'label':exportFormat,'value':exportFormat} for exportFormat in EXPORT_FORMATS],
+                    value='svg',
+                    id='export_format',
+                    inline=True
+                ),
+                html.Button("Export", id="btn_export"),
+                html.Div(id='export_status'),
                 dcc.Download(id="download-image"),
+                dcc.Store(id='export_job'),
+                dcc.Interval(id='export_poll', interval=500, disabled=True), # Polls for the rendered export
                 ##### Extra Export Options #####
                 # Add code here...
             ],
@@ -309,6 +313,15 @@ levels = html.Div(
         dbc.Card(
             [
                 dbc.CardHeader(id='level_scheme_title'),
+                dbc.RadioItems(
+                    options=[
+                        {'label':'Simplified','value':'simplified'},
+                        {'label':'All Levels','value':'full'}
+                    ],
+                    value='simplified',
+                    id='level_scheme_mode',
+                    inline=True
+                ),
                 dcc.Graph(
                     id='level_scheme',#,style={'height':'50vh'}
                 ),
@@ -435,11 +448,8 @@ app.layout = html.Div([
 )
 def update_chart_data(n_clicks):
     if n_clicks == None:
-        # Call ground state information from IAEA
-        # ground_state = iaea.NuChartGS()
-        ground_state = iaea.ground_state
-
-        return ground_state.to_json(orient='split')
+        # Ground state data stays on the server, the browser only keeps the version of the dataset
+        return {'version': iaea.get_data_version()}
     else:
         return no_update
 
@@ -456,6 +466,38 @@ def toggle_offcanvas(n1, is_open):
         return is_open
 
 ##### Nuclear Chart callbacks #####
+chartTitles = {
+    'Half Life': 'Nuclear Chart: log(Half Life)',
+    'Decay Mode': 'Nuclear Chart: Known Primary Decay Mode',
+    'Binding Energy Per Nucleon': 'Nuclear Chart: Binding Energy Per Nucleon',
+    'Year Discovered': 'Nuclear Chart: Year Discovered',
+}
+
+# Bounded cache of built nuclear chart figures (as dicts) shared by all sessions of this worker.
+# The dataset and picture manifest versions are part of the key so new data or pictures never show a stale chart.
+CHART_CACHE_SIZE = int(os.environ.get('CHART_CACHE_SIZE', 32))
+
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+def cachedNuclearChart(dataVersion, pictureVersion, chart_type_name, neutron_max, proton_max, toggle_options):
+    grid = iaea.get_nuclide_grid().view(neutron_max, proton_max)
+    chart = ncdt.build_nuclear_chart(grid, iaea.get_nuclide_index(), chart_type_name, toggle_options)
+    return ncdt.encode_typed_arrays(chart.to_dict())
+
+def chart_cache_info():
+    '''Hit/miss counters and size of the nuclear chart figure cache'''
+    return cachedNuclearChart.cache_info()
+
+def warm_chart_cache():
+    '''Builds the default (20 protons x 28 neutrons) and full chart views of every chart type'''
+    for chart_type_name in chartTitles:
+        for neutron_max, proton_max in [(28, 20), (178, 118)]:
+            cachedNuclearChart(iaea.get_data_version(), approved_pictures.current_version(), chart_type_name,
+                               neutron_max, proton_max, (2,))
+
+# Set CHART_CACHE_WARMUP=1 to build the most common figures at boot (before fork when using gunicorn --preload)
+if os.environ.get('CHART_CACHE_WARMUP', '0') == '1':
+    warm_chart_cache()
+
 # Selecting a subset of data
 @callback(
     Output('current_data','data'),
@@ -463,125 +505,128 @@ def toggle_offcanvas(n1, is_open):
     Input('proton_axis_slider','value'),
     Input('ground_state','data'),
 )
-def update_chart_data(neutron_slider,proton_slider,jsonGroundState):
-    ground_state = pd.read_json(StringIO(jsonGroundState),orient='split')
-    # Filter current data to the slider callbacks
-    currentData = ground_state.loc[(ground_state['n']<=neutron_slider)&(ground_state['z']<=proton_slider),:]
+def update_chart_data(neutron_slider,proton_slider,groundStateKey):
+    # Current data is described by the slider bounds, see currentNuclide() for looking up its nuclei
+    return {'version': groundStateKey['version'], 'neutron_max': neutron_slider, 'proton_max': proton_slider}
+
+def currentNuclide(currentDataKey,n,z):
+    '''Ground state data (one row DataFrame) of nucleus (z, n) if it is shown within the slider bounds, None otherwise'''
+    if n > currentDataKey['neutron_max'] or z > currentDataKey['proton_max']:
+        return None
+    return iaea.ground_state_row(z,n) # O(1) lookup through the NuclideIndex
 
-    return currentData.to_json(orient='split')
+LEVELS_UNREACHABLE = "The level data for this nucleus can't be reached right now, please try again later!"
+
+def isotopeLevelData(A,symbol):
+    '''Levels (with a known J^pi) of a nucleus, raises an exception if they can't be loaded'''
+    def load():
+        try:
+            levels = iaea.NuChartLevels(A,symbol)
+        except pd.errors.EmptyDataError: # IAEA knows no levels of this nucleus
+            levels = pd.DataFrame(columns=['energy','jp'])
+        # Filter out levels that are NaN
+        return known_jp_levels(levels)
+    return sessionStore.get_or_compute(f'isotope_levels:{A}{symbol}', load)
 
 # Selecting Toggles and other chart modifications
 @callback(
     Output('nuclear_chart','figure'),
     Output('nuclear_chart_title','children'),
-    Output('close_tooltip_button','style'),
     Input('chart_type','value'),
     Input('current_data','data'),
+    State('chart_toggle_options','value'),
+)
+def update_chart_type(chart_type_name,currentDataKey,toggle_options):
+    # Figures only depend on these inputs (and the dataset), so they are built once and shared by all sessions
+    chart = cachedNuclearChart(iaea.get_data_version(), approved_pictures.current_version(), chart_type_name,
+                               currentDataKey['neutron_max'], currentDataKey['proton_max'], tuple(sorted(toggle_options)))
+    title = html.H5([chartTitles[chart_type_name]])
+    return chart, title
+
+# Toggling overlays only switches the visibility of their traces instead of resending the whole chart
+@callback(
+    Output('nuclear_chart','figure',allow_duplicate=True),
     Input('chart_toggle_options','value'),
-    Input("nuclear_chart", "clickData"),
+    prevent_initial_call=True,
 )
-def update_chart_type(chart_type_name,jsonCurrentData,toggle_options,nuclearChartClickData):
-    currentData = pd.read_json(StringIO(jsonCurrentData),orient='split')
-    # Additional axes offsets to show magic number tiles later
-    xoffset, yoffset = 2, 2.5
-    xrange = [min(currentData['n'])-xoffset, max(currentData['n'])+0.5]
-    yrange = [min(currentData['z'])-yoffset, max(currentData['z'])]
-    chart = go.Figure()
-
-    ##### If statements for each chart_type_name callback option #####
-    if chart_type_name == 'Half Life':
-        chart_type = ncdt.half_life_plot(currentData)
-        chart.add_traces([chart_type])
-        # chart.update_layout(title=dict(text='Nuclear Chart: log(Half Life)'))
-        title = html.H5(['Nuclear Chart: log(Half Life)'])
-        
-    if chart_type_name == 'Decay Mode':
-        chart_type = ncdt.decay_mode_plot(currentData)
-        chart.add_traces([chart_type])
-        # chart.update_layout(title=dict(text='Nuclear Chart: log(Half Life)'))
-        title = html.H5(['Nuclear Chart: Known Primary Decay Mode'])
-
-    elif chart_type_name == 'Binding Energy Per Nucleon':
-        chart_type = ncdt.binding_energy_per_nucleon_plot(currentData)
-        chart.add_traces([chart_type])
-        # chart.update_layout(title=dict(text='Nuclear Chart: Binding Energy Per Nucleon'))
-        title = html.H5(['Nuclear Chart: Binding Energy Per Nucleon'])
-    
-    elif chart_type_name == 'Year Discovered':
-        chart_type = ncdt.year_discovered_plot(currentData)
-        chart.add_traces([chart_type])
-        # chart.update_layout(title=dict(text='Nuclear Chart: Year Discovered'))
-        title = html.H5(['Nuclear Chart: Year Discovered'])
+def toggle_chart_overlays(toggle_options):
+    chart = Patch()
+    ncdt.set_overlay_visibility(chart['data'],toggle_options)
+    return chart
 
+# Clicking a nucleus only needs to show the button closing its info card, the chart itself is unchanged
+@callback(
+    Output('close_tooltip_button','style'),
+    Input('nuclear_chart','clickData'),
+)
+def show_close_tooltip_button(nuclearChartClickData):
     if nuclearChartClickData is not None:
-        button = dict(display='inline')
-    else:
-        button = dict(display='none')
-
-    # Draw magic numbers
-    ncdt.drawMagicNumbers(chart,xrange,yrange,xoffset, yoffset)
-
-    # Set any chart labels, aspect ratio, etc.
-    magicNumbers = [2, 8, 20, 28, 50, 82, 126]
-    # store current values of magic numbers that fall within given range
-    xVals = [m for m in magicNumbers if (m >= min(xrange)) and (m <= max(xrange))]
-    yVals = [m for m in magicNumbers if (m >= min(yrange)) and (m <= max(yrange))]
-    chart.update_layout(yaxis_scaleanchor='x') # Fix aspect ratio
-    chart.update_xaxes(title_text='Number of Neutrons',showspikes=True,range=xrange,showgrid=False,side='top',tickvals=xVals)
-    chart.update_yaxes(title_text='Number of Protons',showspikes=True,range=yrange,automargin=True,showgrid=False,tickvals=yVals)
-    
-    # Suppress Plotly default hover info and replace later with 'display_hover' function
-    chart.update_traces(hoverinfo='none',hovertemplate=None)
-    
-    ##### Toggle Options from Offcanvas callbacks #####
-    if 1 in toggle_options:
-        # Find which is larger to set our line boundaries
-        points = [min(currentData['n']), max(currentData['n'])]
-        if (points[0] >= min(currentData['z'])) and (points[1] > max(currentData['z'])):
-            points = [min(currentData['z']), max(currentData['z'])]
-        chart.add_trace(go.Scatter(
-            x=points,
-            y=points,
-            mode="lines",
-            name='N=Z Line',
-            hoverinfo='skip',
-            line=dict(color='#5eb588',width=5),
-            showlegend=False
-        ))
-    if 2 in toggle_options:
-        ncdt.show_user_made_nuclei(chart,currentData)
-        
-    return chart, title, button
+        return dict(display='inline')
+    return dict(display='none')
 
 ##### Download chart image #####
-# Callback to handle SVG download
-@app.callback(
-    Output("download-image", "data"),
-    Input("btn_svg_download", "n_clicks"),
-    Input('nuclear_chart','figure'),
-)
-def download_svg(n_clicks, chart):
-    changed_id = [p['prop_id'] for p in ctx.triggered][0]
-
-    if 'btn_svg_download' not in changed_id:
-        return None
-
-    # Convert Plotly figure to SVG
-    svg_content = go.Figure(chart).to_image(format="svg", width=1200, height=800)
+# Exports are rendered in the background by the export service (see chart_export.py) and polled for,
+# so rendering never blocks the worker. Figures are rebuilt from the session keys instead of being uploaded.
+exportSizes = {'chart': (1200, 800), 'level_scheme': (800, 1000)} # (width, height) in px
+EXPORT_TIMEOUT = 120 # Seconds after which polling for an export stops
 
-    # Create a temporary file to store the SVG content
-    _, temp_filepath = tempfile.mkstemp(suffix=".svg")
+@callback(
+    Output('export_job','data'),
+    Output('export_poll','disabled'),
+    Output('export_status','children'),
+    Input('btn_export','n_clicks'),
+    State('export_figure','value'),
+    State('export_format','value'),
+    State('chart_type','value'),
+    State('current_data','data'),
+    State('chart_toggle_options','value'),
+    State('isotope_levels','data'),
+    prevent_initial_call=True,
+)
+def start_export(n_clicks,exportFigure,exportFormat,chart_type_name,currentDataKey,toggle_options,isotopeKey):
+    if exportFigure == 'chart':
+        figure = cachedNuclearChart(iaea.get_data_version(), approved_pictures.current_version(), chart_type_name,
+                                    currentDataKey['neutron_max'], currentDataKey['proton_max'], tuple(sorted(toggle_options)))
+        fileName = 'nuclear_chart'
+    else:
+        if isotopeKey is None:
+            return no_update, True, 'Please select a nucleus to export its level scheme'
+        A, symbol = isotopeKey['A'], isotopeKey['symbol']
+        try:
+            isotopeLevels = isotopeLevelData(A,symbol)
+        except Exception: # They were evicted and IAEA can't be reached right now
+            return no_update, True, LEVELS_UNREACHABLE
+        isotope = iaea.ground_state_row(*iaea.get_nuclide_index().find(A,symbol))
+        figure = simplifiedLevelScheme(A,symbol,isotope,isotopeLevels)
+        fileName = f'level_scheme_{A}{symbol}'
+
+    width, height = exportSizes[exportFigure]
+    jobId = export_service.submit(figure, exportFormat, width, height)
+    job = {'id': jobId, 'format': exportFormat, 'filename': f'{fileName}.{exportFormat}', 'started': time.time()}
+    return job, False, 'Rendering...'
 
+@callback(
+    Output("download-image", "data"),
+    Output('export_poll','disabled',allow_duplicate=True),
+    Output('export_status','children',allow_duplicate=True),
+    Input('export_poll','n_intervals'),
+    State('export_job','data'),
+    prevent_initial_call=True,
+)
+def poll_export(n_intervals,job):
+    # The job comes back from the browser, so anything malformed is treated as an unknown export
+    if (not isinstance(job,dict) or not export_service.is_job(job.get('id'),job.get('format'))
+            or not isinstance(job.get('filename'),str) or not isinstance(job.get('started'),(int,float))):
+        return no_update, True, 'Unknown export, please try again'
     try:
-        with open(temp_filepath, "wb") as f:
-            f.write(svg_content)
-
-        # Return the temporary file path for download
-        return dcc.send_file(temp_filepath, "heatmap.svg")
-
-    finally:
-        # Clean up the temporary file after it's been sent for download
-        os.remove(temp_filepath)
+        content = export_service.result(job['id'],job['format'])
+    except RuntimeError:
+        return no_update, True, 'The export failed, please try again'
+    if content is None: # Still rendering
+        if time.time() - job['started'] > EXPORT_TIMEOUT:
+            return no_update, True, 'The export took too long, please try again'
+        return no_update, no_update, no_update
+    return dcc.send_bytes(content, job['filename']), True, ''
 
 ##### More sophisticated hovermode for Nuclear Chart controlled through the following callback #####
 # for the sake of run performance, we've removed hover in place of click action to cut CPU usage
@@ -598,7 +643,7 @@ def download_svg(n_clicks, chart):
     # prevent_initial_call=True  # Prevent callback from being fired when the app starts
 )
 # def display_hover(hoverData,neutron_slider,jsonCurrentData):
-def display_hover(clickData,neutron_slider,jsonCurrentData, n_clicks):
+def display_hover(clickData,neutron_slider,currentDataKey, n_clicks):
     # global currentData
     if clickData is None:
         return False, no_update, no_update, no_update
@@ -608,10 +653,9 @@ def display_hover(clickData,neutron_slider,jsonCurrentData, n_clicks):
     bbox = pt["bbox"]
 
     # Get data for current hover item
-    currentData = pd.read_json(StringIO(jsonCurrentData),orient='split')
-    df_row = currentData[(currentData['n']==pt['x'])&(currentData['z']==pt['y'])]
+    df_row = currentNuclide(currentDataKey,pt['x'],pt['y'])
     # For no data, Return nothing
-    if df_row.empty:
+    if df_row is None:
         return False, no_update, no_update, no_update
     
     # Check if n_clicks is None
@@ -620,7 +664,7 @@ def display_hover(clickData,neutron_slider,jsonCurrentData, n_clicks):
         if n_clicks > 0:
             return False, no_update, no_update, no_update
 
-    img_src = hnd.decayImgSrc[str(df_row['common_decays'].values[0])] # Get decay image location
+    img_src = image_src(hnd.decayImgSrc[str(df_row['common_decays'].values[0])],'tooltip') # Get (resized) decay image location
     A =  int(df_row['n'].values[0])+int(df_row['z'].values[0]) # Get A value
     symbol = df_row['symbol'].values[0] # Get element symbol
     text = [html.Sup(str(A)), symbol] # Compile Isotope name into correct scientific format with superscript
@@ -674,13 +718,14 @@ def display_hover(clickData,neutron_slider,jsonCurrentData, n_clicks):
     Output('level_scheme_title','children'),    # Constructed title children div layout element
     Output('built_nucleus','src'),              # Constructed graph sent to built_nucleus layout element
     Output('built_nucleus_title','children'),   # Constructed title children div layout element
-    Output('isotope_levels','data'),            # Store isotope levels as json data for current user session
+    Output('isotope_levels','data'),            # Store A and symbol of the selected isotope for current user session
     Input('nuclear_chart','clickData'),         # Input data of selected nucleus from click on nuclear chart
     Input('level_scheme','clickData'),          # Input data of selected level from click on level scheme
-    Input('isotope_levels','data'),             # Input json data of current list of levels (None if no isotope selected)
-    Input('current_data','data'),               # Current data subset of ground state data from nuclear chart
+    Input('isotope_levels','data'),             # Input A and symbol of the selected isotope (None if no isotope selected)
+    Input('current_data','data'),               # Slider bounds of the current subset of ground state data from nuclear chart
+    Input('level_scheme_mode','value'),         # Simplified level scheme or all levels
 )
-def update_level_scheme(chartClickData, levelClickData, jsonIsotopeLevels,jsonCurrentData):
+def update_level_scheme(chartClickData, levelClickData, isotopeKey, currentDataKey, levelSchemeMode):
     '''
     This callback controls the level scheme and which built nuclei to display.
 
@@ -688,6 +733,7 @@ def update_level_scheme(chartClickData, levelClickData, jsonIsotopeLevels,jsonCu
     2) We check if this is on initialization (all callback input data is None) and display defaults
     3) We check if callback was triggered by nuclear_chart -> which updates the built nuclear state considered and its levels
     4) We check if callback was triggered by level_scheme -> which updates only the built nuclear state
+    5) We check if callback was triggered by level_scheme_mode -> which only replots the level scheme
     '''
     # global isotopeLevels # Modify global variable of isotope levels
     dumpClick = json.loads(json.dumps(chartClickData)) # json info from clicking nuclear chart
@@ -698,108 +744,168 @@ def update_level_scheme(chartClickData, levelClickData, jsonIsotopeLevels,jsonCu
     # Default don't show a level scheme
     if triggerID == 'current_data':
         ### Level scheme ###
-        levels = go.Figure()
-        levels.add_trace(go.Scatter(
-            x=[1],
-            y=[1],
-            text=[lsdf.customwrap("Please click a nucleus to see its levels")],
-            mode="text",
-            hoverinfo='skip',
-            textfont={
-                'color':'white'
-            }
-        ))
-        levels.update_yaxes(showticklabels=False,showgrid=False)
-        levels.update_xaxes(showticklabels=False,showgrid=False)
+        levels = levelSchemeMessage("Please click a nucleus to see its levels")
         levels_title = html.H6(['Please select a nucleus:'])
 
         ### Built nucleus image ###
         # Default header information 
         text = html.H6(['Please select a nucleus to see a block version of it:'])
-        image = imagePath + 'logo.png'
+        image = image_src(imagePath + 'logo.png','card')
         return levels, levels_title, image, text, no_update
 
+    # Changing the level scheme mode before a nucleus is selected, or clicking anything but an excitation group, changes nothing
+    if (triggerID == 'level_scheme_mode') and isotopeKey is None:
+        return no_update, no_update, no_update, no_update, no_update
+    if (triggerID == 'level_scheme') and (isotopeKey is None or clickedExcitation(dumpHover,levelSchemeMode) is None):
+        return no_update, no_update, no_update, no_update, no_update
+
     # In the case someone clicks on an invalid nucleus on the nuclear chart, we don't send any updates
-    if (triggerID == 'nuclear_chart') and (dumpClick['points'][0]['z'] == None):
+    if (triggerID == 'nuclear_chart') and currentNuclide(currentDataKey,dumpClick['points'][0]['x'],dumpClick['points'][0]['y']) is None:
         return no_update, no_update, no_update, no_update, no_update
-    
-    currentData = pd.read_json(StringIO(jsonCurrentData),orient='split')
 
     # When we click on a new nucleus on the nuclear chart, load the corresponding level data, this avoids unnecessary reloads
     if triggerID == 'nuclear_chart':
         nucChartDump = dumpClick['points'][0] 
         n, z = nucChartDump['x'], nucChartDump['y']
-        element = currentData.loc[(currentData['z']==z)] # Get element chain data
-        isotope = element[element['n']==n] # Get specific isotope data
+        isotope = currentNuclide(currentDataKey,n,z) # Get specific isotope data
         symbol = isotope['symbol'].values[0] # Get corresponding symbol name for element
         A = n + z
         
         # Get level data and plot levels
-        isotopeLevels = iaea.NuChartLevels(A,symbol)
-
-        # Filter out levels that are NaN
-        isotopeLevels = isotopeLevels.dropna(subset=['jp'])
+        try:
+            isotopeLevels = isotopeLevelData(A,symbol)
+        except Exception: # IAEA is slow or unreachable and the levels haven't been cached yet
+            levels = levelSchemeMessage(LEVELS_UNREACHABLE)
+            return levels, html.H6(['Level Scheme for ',html.Sup(A),symbol]), no_update, no_update, no_update
     else:
-        isotopeLevels = pd.read_json(StringIO(jsonIsotopeLevels),orient='split')
+        # Levels of the selected isotope are kept on the server (and reloaded if they were evicted)
+        try:
+            isotopeLevels = isotopeLevelData(isotopeKey['A'],isotopeKey['symbol'])
+        except Exception: # They were evicted and IAEA can't be reached right now
+            return levelSchemeMessage(LEVELS_UNREACHABLE), no_update, no_update, no_update, no_update
     
     #### Loading Images of Built nuclei ####
     # When a nucleus is selected on the nuclear chart, update level scheme and image to ground state '_0'
     if triggerID == 'nuclear_chart':
         ### Level scheme ###
-        # Note, we can also print the detailed level scheme for each level using function plot_level_scheme()
-        levels = lsdf.plot_simplified_level_scheme(currentData,isotopeLevels)
+        levels = levelSchemeFigure(levelSchemeMode,A,symbol,isotope,isotopeLevels)
         levels_title = html.H6(['Level Scheme for ',html.Sup(A),symbol])
 
         ### Built nucleus image ###
-        # Get list of files in desired directory (note: all images MUST be in a directory called 'assets')
-        picturePath = 'assets/Approved_Pictures'
-        directoryFiles = [f for f in os.listdir(picturePath) if os.path.isfile(os.path.join(picturePath,f))]
-        # Get ground state file name given path, A, and symbol
-        pictureFile = [f for f in directoryFiles if (str(A) + symbol + '_0') in f]
+        # Get the ground state picture given A and symbol (note: all images MUST be in a directory called 'assets')
+        picture = approved_pictures.get(A,symbol,0)
 
         # For showing picture of built nucleus
-        if not pictureFile: # If picture file list is empty, display discovery image and text
+        if picture is None: # If no picture was found, display discovery image and text
             text = html.H6(['Hey, it looks like no one has discovered this state yet! Did you make this state?'])
-            image = imagePath + 'nuclear_discovery_logo.png'
+            image = image_src(imagePath + 'nuclear_discovery_logo.png','card')
         else: # If picture was found, shows the ground state
-            discovererNames = collaboratorNames(pictureFile[0])
+            discovererNames = oxfordComma(picture.names)
             text = html.H6(['You\'re currently looking at the ground state of: ',
                     html.Sup(str(A)), symbol, html.Br(),
                     'Discovered by: ',discovererNames])
-            image = os.path.join(picturePath,pictureFile[0])
+            image = image_src(picture.path,'card') # Resized copy of the picture
+
+    # When the level scheme mode changes, only the level scheme is replotted
+    elif triggerID == 'level_scheme_mode':
+        A, symbol = isotopeKey['A'], isotopeKey['symbol']
+        isotope = iaea.ground_state_row(*iaea.get_nuclide_index().find(A,symbol))
+        return levelSchemeFigure(levelSchemeMode,A,symbol,isotope,isotopeLevels), no_update, no_update, no_update, no_update
 
     # When a level or excitation group is hovered over on the level scheme graph, update built image to the excitation '_#'
     elif triggerID == 'level_scheme':
         # Get data for level or excitation group before displaying image or level scheme
-        A = isotopeLevels['n'].unique()[0] + isotopeLevels['z'].unique()[0]
-        symbol = isotopeLevels['symbol'].unique()[0]
-        excitation = dumpHover['points'][0]['customdata'][0] # new usage for plot_simplified_level_scheme() function
+        A, symbol = isotopeKey['A'], isotopeKey['symbol']
+        isotope = iaea.ground_state_row(*iaea.get_nuclide_index().find(A,symbol)) # Get specific isotope data
+        excitation = clickedExcitation(dumpHover,levelSchemeMode) # Excitation group id of the clicked level
 
         ### Level scheme ###
-        # Note, we can also print the detailed level scheme for each level using function plot_level_scheme()
-        levels = lsdf.plot_simplified_level_scheme(currentData,isotopeLevels)
+        # The level data hasn't changed, so this is a lookup of the stored figure
+        levels = levelSchemeFigure(levelSchemeMode,A,symbol,isotope,isotopeLevels)
         levels_title = html.H6(['Level Scheme for ',html.Sup(A),symbol])
 
         ### Built nucleus image ###
-        # Get list of files in directory
-        picturePath = 'assets/Approved_Pictures'
-        directoryFiles = [f for f in os.listdir(picturePath) if os.path.isfile(os.path.join(picturePath,f))]
-        # Get ground state file name given path, A, and symbol
-        pictureFile = [f for f in directoryFiles if (str(A) + symbol + f'_{int(excitation)}') in f]
+        # Get the picture of the excitation given A and symbol
+        picture = approved_pictures.get(A,symbol,excitation)
 
         # For showing picture of built nucleus
-        if not pictureFile: # If picture file list is empty, display discovery image and text
+        if picture is None: # If no picture was found, display discovery image and text
             text = html.H6(['Hey, it looks like no one has discovered this state yet! Did you make this state?'])
-            image = imagePath + 'nuclear_discovery_logo.png'
+            image = image_src(imagePath + 'nuclear_discovery_logo.png','card')
         else: # If picture was found, shows the ground state
-            discovererNames = collaboratorNames(pictureFile[0]) # Given a file name, get a string of collaborator names
-            exString = getExcitationGroupString(pictureFile[0]) # Given a file name, get the excitation in a nice html format
+            discovererNames = oxfordComma(picture.names) # String of collaborator names
+            exString = getExcitationGroupString(picture.file) # Given a file name, get the excitation in a nice html format
             text = html.H6([f'You\'re currently looking at the ', exString[0], exString[1], exString[2], ' of: ',
                     html.Sup(str(A)), symbol, html.Br(),
                     'Discovered by: ',discovererNames])
-            image = os.path.join(picturePath,pictureFile[0])
+            image = image_src(picture.path,'card') # Resized copy of the picture
+
+    return levels, levels_title, image, text, {'A': int(A), 'symbol': symbol}
+
+def simplifiedLevelScheme(A,symbol,isotope,isotopeLevels):
+    '''Simplified level scheme figure of a nucleus, precomputed by build_level_schemes.py or built (and stored) once'''
+    if not has_levels(isotopeLevels): # Nothing to draw (these aren't kept in the level scheme store)
+        return levelSchemeMessage("There are no levels with a known J^pi for this nucleus yet!")
+    return level_scheme_store.get_or_build(f'{A}{symbol}',isotope,isotopeLevels)
+
+def clickedExcitation(levelClickData,levelSchemeMode):
+    '''
+    Excitation group id of a level clicked on the simplified level scheme, None for anything else (e.g. the text of
+    a message, or a bin of the full level scheme, whose customdata is a J^pi name)
+    '''
+    if levelSchemeMode == 'full' or not levelClickData or not levelClickData.get('points'):
+        return None
+    excitation = levelClickData['points'][0].get('customdata')
+    if isinstance(excitation,list): # Clicking a group box's fill gives the customdata of the whole trace
+        excitation = excitation[0] if excitation else None
+    if isinstance(excitation,bool) or not isinstance(excitation,int):
+        return None
+    return excitation
 
-    return levels, levels_title, image, text, isotopeLevels.to_json(orient='split')
+def levelSchemeFigure(levelSchemeMode,A,symbol,isotope,isotopeLevels):
+    '''Level scheme figure of a nucleus in the selected mode (excitation groups or all levels)'''
+    if levelSchemeMode == 'full' and has_levels(isotopeLevels):
+        return lsdf.plot_full_level_scheme(isotope,isotopeLevels)
+    return simplifiedLevelScheme(A,symbol,isotope,isotopeLevels)
+
+def relayoutRange(relayoutData,axis):
+    '''
+    Range of an axis ('xaxis' or 'yaxis') set by zooming the graph, None when it was reset (autorange) and
+    no_update if it didn't change
+    '''
+    if f'{axis}.range[0]' in relayoutData:
+        return [relayoutData[f'{axis}.range[0]'], relayoutData[f'{axis}.range[1]']]
+    if f'{axis}.range' in relayoutData:
+        return list(relayoutData[f'{axis}.range'])
+    if relayoutData.get(f'{axis}.autorange'):
+        return None
+    return no_update
+
+# Zooming the full level scheme replots the visible window, at the level of detail that fits on screen
+@callback(
+    Output('level_scheme','figure',allow_duplicate=True),
+    Input('level_scheme','relayoutData'),
+    State('level_scheme_mode','value'),
+    State('isotope_levels','data'),
+    prevent_initial_call=True,
+)
+def refine_level_scheme(relayoutData,levelSchemeMode,isotopeKey):
+    if levelSchemeMode != 'full' or isotopeKey is None or not relayoutData:
+        return no_update
+    energyRange, columnRange = relayoutRange(relayoutData,'yaxis'), relayoutRange(relayoutData,'xaxis')
+    if energyRange is no_update and columnRange is no_update: # e.g. autosize or dragging the legend
+        return no_update
+    A, symbol = isotopeKey['A'], isotopeKey['symbol']
+    try:
+        isotopeLevels = isotopeLevelData(A,symbol)
+    except Exception: # They were evicted and IAEA can't be reached right now
+        return levelSchemeMessage(LEVELS_UNREACHABLE)
+    if not has_levels(isotopeLevels): # The level scheme only shows a message
+        return no_update
+    isotope = iaea.ground_state_row(*iaea.get_nuclide_index().find(A,symbol))
+    return lsdf.plot_full_level_scheme(isotope,isotopeLevels,
+                                       energyRange=None if energyRange is no_update else energyRange,
+                                       columnRange=None if columnRange is no_update else columnRange)
 
 
 
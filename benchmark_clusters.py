@@ -0,0 +1,75 @@
+'''
+Benchmark of level scheme clustering: times level_scheme_display_functions.find_best_clusters against the
+scikit-learn KMeans version it replaced, for a range of level counts.
+
+scikit-learn is no longer needed by the app, so the KMeans version is only timed when it's installed.
+Level energies are random (in keV, like the IAEA data) unless a nuclide is given, e.g.:
+    python benchmark_clusters.py --nuclide 56Fe
+'''
+
+import time
+import argparse
+import numpy as np
+
+from level_scheme_display_functions import find_best_clusters
+
+
+def kmeans_best_clusters(data, num_clusters=3):
+    '''The previous find_best_clusters, using scikit-learn's KMeans'''
+    from sklearn.cluster import KMeans
+    data = np.array(data).reshape(-1, 1)
+    kmeans = KMeans(n_clusters=num_clusters, random_state=0, n_init='auto')
+    kmeans.fit(data)
+    labels = kmeans.labels_
+    cluster_centers = kmeans.cluster_centers_
+    cluster_inertia = [np.sum((data[labels == i] - cluster_centers[i]) ** 2) for i in range(num_clusters)]
+    sorted_clusters = sorted(range(num_clusters), key=lambda i: cluster_inertia[i])
+    return [data[labels == sorted_clusters[i]].flatten() for i in range(num_clusters)]
+
+def inertia(clusters):
+    return sum(np.sum((cluster - cluster.mean())**2) for cluster in clusters)
+
+def best_time(function, data, num_clusters, repeats):
+    '''Best wall time of repeats calls in ms, along with the clusters found'''
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        clusters = function(data, num_clusters=num_clusters)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1e3, clusters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark level scheme clustering.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 50, 200, 1000, 5000], help='Numbers of levels')
+    parser.add_argument('--clusters', type=int, default=3, help='Number of clusters (default: %(default)s)')
+    parser.add_argument('--repeats', type=int, default=5, help='Calls per measurement (default: %(default)s)')
+    parser.add_argument('--nuclide', default=None, help='Use the levels of a nuclide (e.g. 56Fe) instead of random ones')
+    args = parser.parse_args()
+
+    try:
+        import sklearn # noqa: F401
+        hasSklearn = True
+    except ImportError:
+        hasSklearn = False
+        print('scikit-learn is not installed, only timing find_best_clusters')
+
+    if args.nuclide:
+        import iaea_data as iaea
+        from nuclear_chart_display_types import separateSymAndA
+        A, symbol = separateSymAndA(args.nuclide)
+        datasets = [iaea.NuChartLevels(A, symbol)['energy'].dropna().to_numpy()]
+    else:
+        rng = np.random.default_rng(0)
+        datasets = [np.sort(rng.exponential(3000, size)) for size in args.sizes]
+
+    print(f'{"levels":>7} {"exact (ms)":>11} {"KMeans (ms)":>12} {"speedup":>8} {"inertia ratio":>14}')
+    for data in datasets:
+        exactTime, exactClusters = best_time(find_best_clusters, data, args.clusters, args.repeats)
+        if not hasSklearn:
+            print(f'{len(data):>7} {exactTime:>11.2f}')
+            continue
+        kmeansTime, kmeansClusters = best_time(kmeans_best_clusters, data, args.clusters, args.repeats)
+        # The exact clustering never has a larger inertia than KMeans (ratio <= 1)
+        ratio = inertia(exactClusters) / inertia(kmeansClusters) if inertia(kmeansClusters) else 1.0
+        print(f'{len(data):>7} {exactTime:>11.2f} {kmeansTime:>12.2f} {kmeansTime/exactTime:>7.1f}x {ratio:>14.4f}')
@@ -0,0 +1,63 @@
+'''
+Benchmark of ground state post-processing: times iaea_data.process_ground_state against the row-wise
+(iterrows) version it replaced, on the shipped ground state data.
+
+Example:
+    python benchmark_ground_state.py --repeats 5
+'''
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import iaea_data as iaea
+
+# Columns added by process_ground_state, dropped from the shipped (already processed) data before timing
+PROCESSED_COLUMNS = ['A_symbol', 'log(half_life_sec)', 'common_decays']
+
+
+def rowwise_process_ground_state(ground_state):
+    '''The previous ground state post-processing, one row at a time'''
+    ground_state['n'] = ground_state['n'].astype(int)
+    ground_state['z'] = ground_state['z'].astype(int)
+    ground_state['A_symbol'] = ['<sup>'+str(row['n']+row['z'])+'</sup>'+row['symbol'] for index,row in ground_state.iterrows()]
+    for i, row in ground_state.iterrows():
+        try:
+            ground_state.loc[i,'log(half_life_sec)'] = np.log10(float(row['half_life_sec']))
+        except:
+            ground_state.loc[i,'log(half_life_sec)'] = 0
+        try:
+            ground_state.loc[i,'common_decays'] = iaea.decayOrder[row['decay_1']]
+        except:
+            ground_state.loc[i,'common_decays'] = row['decay_1']
+    ground_state.loc[ground_state['half_life']=='STABLE','common_decays'] = 'Stable'
+    ground_state = ground_state[~(np.isnan(ground_state['binding']) & np.isnan(ground_state['sp']) &
+                                  np.isnan(ground_state['sn']) & np.isnan(ground_state['massexcess']))]
+    return ground_state
+
+def raw_ground_state():
+    '''The shipped ground state data without the columns added by process_ground_state'''
+    return pd.read_csv(iaea.SHIPPED_GROUND_STATE_PATH, index_col=0).drop(columns=PROCESSED_COLUMNS, errors='ignore')
+
+def best_time(function, raw, repeats):
+    '''Best wall time of repeats calls in ms (each on a fresh copy of the data)'''
+    times = []
+    for _ in range(repeats):
+        data = raw.copy()
+        start = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1e3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ground state post-processing.')
+    parser.add_argument('--repeats', type=int, default=3, help='Calls per measurement (default: %(default)s)')
+    args = parser.parse_args()
+
+    raw = raw_ground_state()
+    rowwiseTime = best_time(rowwise_process_ground_state, raw, args.repeats)
+    vectorizedTime = best_time(iaea.process_ground_state, raw, args.repeats)
+    print(f'{len(raw)} nuclides: row-wise {rowwiseTime:.1f} ms, vectorized {vectorizedTime:.1f} ms '
+          f'({rowwiseTime/vectorizedTime:.0f}x)')
@@ -0,0 +1,163 @@
+'''
+Command line tool which crawls the IAEA livechart and builds the offline data bundle loaded by the app.
+
+The bundle is a single level store file (see level_store.py) holding the tables:
+ - ground_states: Processed ground state data (same columns as iaea_data.get_ground_state())
+ - levels:        Levels of every nuclide
+ - gammas:        Gamma transitions of every nuclide (only with --gammas)
+along with a version, the creation date and a checksum of the data.
+
+Every response is checkpointed as a csv file, so an interrupted crawl picks up where it stopped when it's
+run again with the same --checkpoint-dir. Requests run on a bounded thread pool and are spaced out by a
+shared rate limit to stay polite to the IAEA servers.
+
+Example (e.g. during a docker build):
+    python build_data_bundle.py --workers 4 --rate 2 --output data/level_store.bin
+'''
+
+import os
+import time
+import argparse
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+
+import iaea_data as iaea
+from level_store import LEVEL_STORE_PATH, write_store
+
+logger = logging.getLogger('build_data_bundle')
+
+BUNDLE_FORMAT_VERSION = 1
+
+
+class RateLimiter:
+    '''Spaces out calls to wait() (from any thread) by at least 1/rate seconds'''
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Crawler:
+    '''
+    Downloads livechart csv files through iaea_data.lc_pd_dataframe with checkpointing. Failed connections and
+    429/5xx replies are retried by its HTTP session (IAEA_RETRIES times, with backoff), a download which still
+    fails is left for the next run to resume.
+    '''
+    def __init__(self, url, checkpointDir, rate=2.0):
+        self.url = url
+        self.checkpointDir = checkpointDir
+        self.limiter = RateLimiter(rate)
+
+    def checkpoint_path(self, field, nuclide):
+        return os.path.join(self.checkpointDir, field, f'{nuclide}.csv')
+
+    def fetch(self, field, nuclide):
+        '''Returns the livechart data of one field/nuclide pair, from its checkpoint if it was already downloaded'''
+        path = self.checkpoint_path(field, nuclide)
+        if os.path.exists(path):
+            return read_checkpoint(path)
+        self.limiter.wait()
+        try:
+            frame = iaea.lc_pd_dataframe(self.url + f'fields={field}&nuclides={nuclide}')
+        except pd.errors.EmptyDataError: # Nothing known for this nuclide, checkpointed so it's never asked again
+            frame = pd.DataFrame()
+        write_checkpoint(path, frame)
+        return frame
+
+
+def read_checkpoint(path):
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame()
+    return pd.read_csv(path)
+
+def write_checkpoint(path, frame):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tempPath = path + '.tmp'
+    with open(tempPath, 'w') as f:
+        if len(frame.columns): # Empty responses are stored as empty files
+            frame.to_csv(f, index=False)
+    os.replace(tempPath, path)
+
+def nuclide_names(groundState):
+    '''List of livechart nuclide names (e.g. '12C') in the ground state data'''
+    return [f'{z+n}{symbol}' for z, n, symbol in zip(groundState['z'], groundState['n'], groundState['symbol'])]
+
+def crawl(crawler, nuclides, fields, workers):
+    '''Fetches all fields for all nuclides, returns ({field: [DataFrames]}, [failed (field, nuclide)])'''
+    frames = {field: [] for field in fields}
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(crawler.fetch, field, nuclide): (field, nuclide)
+                   for field in fields for nuclide in nuclides}
+        for done, future in enumerate(as_completed(futures), start=1):
+            field, nuclide = futures[future]
+            try:
+                frame = future.result()
+            except Exception as e:
+                logger.error('Failed to download %s for %s: %s', field, nuclide, e)
+                failed.append((field, nuclide))
+                continue
+            if len(frame) and {'z','n'} <= set(frame.columns):
+                frames[field].append(frame)
+            if done % 100 == 0:
+                logger.info('Downloaded %d/%d files', done, len(futures))
+    return frames, failed
+
+def build_bundle(url=iaea.livechart, output=LEVEL_STORE_PATH, checkpointDir=None, workers=4, rate=2.0,
+                 gammas=False, version=None):
+    '''Crawls the livechart and writes the data bundle, returns the list of downloads that failed'''
+    checkpointDir = checkpointDir or os.path.join(os.path.dirname(output), 'crawl_checkpoint')
+    crawler = Crawler(url, checkpointDir, rate=rate)
+
+    groundState = iaea.process_ground_state(crawler.fetch('ground_states', 'all'))
+    nuclides = nuclide_names(groundState)
+    fields = ['levels'] + (['gammas'] if gammas else [])
+    logger.info('Crawling %s for %d nuclides', ', '.join(fields), len(nuclides))
+    frames, failed = crawl(crawler, nuclides, fields, workers)
+    if failed:
+        return failed
+
+    tables = {'ground_states': groundState}
+    for field, fieldFrames in frames.items():
+        if fieldFrames:
+            tables[field] = pd.concat(fieldFrames, ignore_index=True)
+    meta = {
+        'format': BUNDLE_FORMAT_VERSION,
+        'version': version or time.strftime('%Y%m%d'),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'source': url,
+        'extraction_date': str(groundState['Extraction_date'].max()),
+        'complete_levels': True, # Every nuclide was crawled, so missing levels mean IAEA has none
+    }
+    write_store(output, tables, meta=meta)
+    logger.info('Wrote data bundle %s (version %s)', output, meta['version'])
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the offline IAEA data bundle for the Nuclear Building Blocks app.')
+    parser.add_argument('--output', default=LEVEL_STORE_PATH, help='Location of the bundle (default: %(default)s)')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Directory of downloaded files used to resume a crawl (default: next to the output)')
+    parser.add_argument('--url', default=iaea.livechart, help='Livechart service URL (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of concurrent downloads (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=2.0, help='Maximum requests per second (default: %(default)s)')
+    parser.add_argument('--gammas', action='store_true', help='Also download the gamma transitions of every nuclide')
+    parser.add_argument('--version', default=None, help='Version label stored in the bundle (default: today\'s date)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    failed = build_bundle(args.url, args.output, args.checkpoint_dir, args.workers, args.rate, args.gammas, args.version)
+    if failed:
+        logger.error('%d downloads failed, run again to resume the crawl', len(failed))
+        raise SystemExit(1)
@@ -0,0 +1,198 @@
+'''
+Command line tool which renders static nuclear chart figures (e.g. for print or paper_figures/) for every
+combination of the given chart types, chart ranges, overlay toggles and formats.
+
+Figures are built with the same code as the app's chart (nuclear_chart_display_types.build_nuclear_chart)
+and rendered in parallel on a process pool, each process running its own Kaleido renderer.
+
+Every figure is named after its parameters, and a hash of everything it's drawn from is recorded in a manifest
+next to it: the content of the dataset and of the picture manifest, the chart format
+(nuclear_chart_display_types.CHART_FORMAT), the plotly and Kaleido versions and the parameters. Figures whose
+hash didn't change are skipped, so running it again only renders what's new. Use --force to render everything
+again. The hash is of the inputs, not the files: Kaleido's output isn't byte for byte reproducible (svg clip
+path ids are random and pdf files carry their creation date), so two renders of a figure can differ as files.
+
+Example:
+    python build_figures.py --chart-types decay_mode_plot half_life_plot --ranges 28x20 178x118 \\
+        --overlays none 1,2 --formats svg pdf --output paper_figures/charts
+'''
+
+import os
+import json
+import hashlib
+import argparse
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import plotly
+import plotly.io as pio
+
+import iaea_data as iaea
+import nuclear_chart_display_types as ncdt
+from picture_manifest import approved_pictures
+from chart_export import EXPORT_FORMATS
+
+logger = logging.getLogger('build_figures')
+
+MANIFEST_NAME = 'figures.json'
+APP_TEMPLATE = 'app' # The app's own (dark) figure template, see nuclear_chart_display_types.load_app_template
+
+# Chart types can be given by their plot function (e.g. decay_mode_plot) or their name in the app
+CHART_TYPES = {function.__name__: name for name, function in ncdt.chartTypes.items()}
+
+
+def chart_type_name(chartType):
+    '''App name of a chart type given as a plot function name or app name (e.g. 'Decay Mode')'''
+    if chartType in ncdt.chartTypes:
+        return chartType
+    if chartType in CHART_TYPES:
+        return CHART_TYPES[chartType]
+    raise argparse.ArgumentTypeError(f'Unknown chart type {chartType!r}, use one of {", ".join(CHART_TYPES)}')
+
+def chart_range(value):
+    '''(neutron_max, proton_max) of a range given as NxZ (e.g. 28x20, like the app's sliders)'''
+    try:
+        neutronMax, protonMax = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid range {value!r}, expected NxZ (e.g. 28x20)')
+    return neutronMax, protonMax
+
+def overlay_options(value):
+    '''Chart toggle options given as a comma separated list (1: N=Z line, 2: user-made nuclei) or none'''
+    if value.lower() == 'none':
+        return ()
+    try:
+        options = tuple(sorted({int(v) for v in value.split(',')}))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid overlays {value!r}, expected e.g. 1,2 or none')
+    unknown = set(options) - set(ncdt.overlayTraces)
+    if unknown:
+        raise argparse.ArgumentTypeError(f'Unknown overlay options {sorted(unknown)}, use {sorted(ncdt.overlayTraces)}')
+    return options
+
+
+def figure_jobs(chartTypes, ranges, overlays, formats):
+    '''Parameters of every figure of the matrix as dicts, in a fixed order'''
+    jobs = []
+    for chartType, (neutronMax, protonMax), toggleOptions, format in itertools.product(chartTypes, ranges, overlays, formats):
+        overlayName = '-'.join(map(str, toggleOptions)) or 'none'
+        slug = chartType.lower().replace(' ', '_')
+        jobs.append({
+            'chart_type': chartType,
+            'neutron_max': neutronMax,
+            'proton_max': protonMax,
+            'toggle_options': toggleOptions,
+            'format': format,
+            'filename': f'{slug}_N{neutronMax}_Z{protonMax}_overlays-{overlayName}.{format}',
+        })
+    return jobs
+
+def renderer_version():
+    '''Versions of the code drawing and rendering the figures'''
+    try:
+        from importlib.metadata import version
+        kaleidoVersion = version('kaleido')
+    except Exception:
+        kaleidoVersion = None
+    return f'chart{ncdt.CHART_FORMAT}-plotly{plotly.__version__}-kaleido{kaleidoVersion}'
+
+def job_hash(job, dataVersion, pictureVersion, width, height, template, rendererVersion):
+    '''Hash of everything a figure is drawn from: the data and pictures, the drawing code and all of its parameters'''
+    key = json.dumps({**job, 'data': dataVersion, 'pictures': pictureVersion, 'width': width, 'height': height,
+                      'template': template, 'renderer': rendererVersion}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _init_worker(template):
+    # Processes forked from the main one already share its ground state data, others load it here
+    iaea.preload_ground_state()
+    if template == APP_TEMPLATE:
+        ncdt.load_app_template()
+    else:
+        pio.templates.default = template
+
+def render_figure(job, directory, width, height):
+    '''Builds and renders one figure of the matrix into directory'''
+    grid = iaea.get_nuclide_grid().view(job['neutron_max'], job['proton_max'])
+    chart = ncdt.build_nuclear_chart(grid, iaea.get_nuclide_index(), job['chart_type'], job['toggle_options'])
+    content = pio.to_image(chart, format=job['format'], width=width, height=height)
+    path = os.path.join(directory, job['filename'])
+    tempPath = path + '.tmp{}'.format(os.getpid())
+    with open(tempPath, 'wb') as f:
+        f.write(content)
+    os.replace(tempPath, path)
+    return job['filename']
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_manifest(directory, manifest):
+    tempPath = os.path.join(directory, MANIFEST_NAME + '.tmp')
+    with open(tempPath, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tempPath, os.path.join(directory, MANIFEST_NAME))
+
+def build_figures(jobs, directory, width=1200, height=800, template=APP_TEMPLATE, workers=None, force=False):
+    '''Renders the figures whose hash (see job_hash) changed, returns the list of figures that failed'''
+    os.makedirs(directory, exist_ok=True)
+    # Figures are built from one consistent dataset, so don't refresh it from IAEA while rendering
+    iaea.GROUND_STATE_REFRESH = False
+    iaea.preload_ground_state()
+    dataVersion, pictureVersion, rendererVersion = iaea.get_data_version(), approved_pictures.content_hash(), renderer_version()
+    templateVersion = f'{APP_TEMPLATE}-{ncdt.APP_TEMPLATE_HASH}' if template == APP_TEMPLATE else template
+
+    manifest = read_manifest(directory)
+    hashes = {job['filename']: job_hash(job, dataVersion, pictureVersion, width, height, templateVersion, rendererVersion)
+              for job in jobs}
+    todo = [job for job in jobs if force or manifest.get(job['filename']) != hashes[job['filename']]
+            or not os.path.exists(os.path.join(directory, job['filename']))]
+    logger.info('%d figures, %d up to date', len(jobs), len(jobs) - len(todo))
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(template,)) as pool:
+        futures = {pool.submit(render_figure, job, directory, width, height): job['filename'] for job in todo}
+        for done, future in enumerate(as_completed(futures), start=1):
+            fileName = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error('Failed to render %s: %s', fileName, e)
+                failed.append(fileName)
+                manifest.pop(fileName, None)
+                continue
+            manifest[fileName] = hashes[fileName]
+            logger.info('[%d/%d] %s', done, len(todo), fileName)
+    write_manifest(directory, manifest)
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render static nuclear chart figures of the Nuclear Building Blocks app.')
+    parser.add_argument('--chart-types', nargs='+', type=chart_type_name, default=list(ncdt.chartTypes),
+                        help=f'Chart types ({", ".join(CHART_TYPES)}, default: all)')
+    parser.add_argument('--ranges', nargs='+', type=chart_range, default=[(28, 20), (178, 118)],
+                        help='Maximum neutron and proton numbers shown as NxZ (default: 28x20 178x118)')
+    parser.add_argument('--overlays', nargs='+', type=overlay_options, default=[(2,)],
+                        help='Overlay toggles per figure, e.g. none, 1 (N=Z line), 2 (user-made nuclei) or 1,2 (default: 2)')
+    parser.add_argument('--formats', nargs='+', choices=list(EXPORT_FORMATS), default=['svg'],
+                        help='File formats (default: svg)')
+    parser.add_argument('--output', default='figures', help='Directory of the figures (default: %(default)s)')
+    parser.add_argument('--width', type=int, default=1200, help='Figure width in px (default: %(default)s)')
+    parser.add_argument('--height', type=int, default=800, help='Figure height in px (default: %(default)s)')
+    parser.add_argument('--template', default=APP_TEMPLATE,
+                        help=f'Plotly template, or {APP_TEMPLATE} for the same look as in the app (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of rendering processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='Render all figures, even those which are up to date')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    jobs = figure_jobs(args.chart_types, args.ranges, args.overlays, args.formats)
+    failed = build_figures(jobs, args.output, args.width, args.height, args.template, args.workers, args.force)
+    if failed:
+        logger.error('%d figures failed, run again to retry them', len(failed))
+        raise SystemExit(1)
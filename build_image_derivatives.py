@@ -0,0 +1,75 @@
+'''
+Command line tool which writes the web-optimized derivatives of the app's images (see image_derivatives.py)
+along with their manifest. Needs Pillow.
+
+By default it covers the decay mode pictures (tooltip size), the pictures of built nuclei and the logos
+shown on the built nucleus card (card size). Derivatives which already exist are kept, so running it again
+only processes new or changed images.
+
+Example (e.g. during a docker build):
+    python build_image_derivatives.py
+'''
+
+import os
+import json
+import argparse
+import logging
+
+from image_derivatives import DERIVED_IMAGE_PATH, MANIFEST_NAME, SIZES, manifest_entry, write_derivative
+from picture_manifest import PICTURE_PATH
+
+logger = logging.getLogger('build_image_derivatives')
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+# Directories or files of images and the size buckets they are shown in
+IMAGE_SOURCES = [
+    ('assets/decay_modes', ['tooltip']),
+    (PICTURE_PATH, ['card']),
+    ('assets/logo.png', ['card']),
+    ('assets/nuclear_discovery_logo.png', ['card']),
+]
+
+
+def list_images(source):
+    '''Paths of the images of a directory (or the file itself), relative like the srcs used in the app'''
+    if os.path.isfile(source):
+        return [source]
+    return sorted(os.path.join(source, f) for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+def build_derivatives(sources=IMAGE_SOURCES, directory=DERIVED_IMAGE_PATH):
+    '''Writes the derivatives of all images and the manifest, returns the manifest'''
+    manifest = {}
+    originalBytes = derivedBytes = 0
+    for source, sizes in sources:
+        for image in list_images(source):
+            derivatives = {size: write_derivative(image, size, directory) for size in sizes}
+            manifest[image] = manifest_entry(image, derivatives)
+            for name in derivatives.values():
+                originalBytes += os.path.getsize(image)
+                derivedBytes += os.path.getsize(os.path.join(directory, name))
+                logger.info('%s -> %s', image, name)
+
+    tempPath = os.path.join(directory, MANIFEST_NAME + '.tmp')
+    with open(tempPath, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tempPath, os.path.join(directory, MANIFEST_NAME))
+
+    # Remove derivatives no image refers to anymore (e.g. of replaced pictures)
+    current = {name for entry in manifest.values() for name in entry['derivatives'].values()}
+    for name in os.listdir(directory):
+        if name.endswith('.webp') and name not in current:
+            os.remove(os.path.join(directory, name))
+    logger.info('%d images: %.1f MB of originals -> %.2f MB of derivatives', len(manifest), originalBytes/1e6, derivedBytes/1e6)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the web-optimized image derivatives of the Nuclear Building Blocks app.')
+    parser.add_argument('--output', default=DERIVED_IMAGE_PATH, help='Directory of the derivatives (default: %(default)s)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    os.makedirs(args.output, exist_ok=True)
+    build_derivatives(directory=args.output)
+    logger.info('Size buckets: %s', ', '.join(f'{name} {width}px' for name, width in SIZES.items()))
@@ -0,0 +1,105 @@
+'''
+Command line tool which precomputes the simplified level scheme figure of every nuclide into the level scheme store (see level_scheme_store.py), so the app only looks them up.
+
+Level schemes are built in parallel on a process pool. A nuclide is only rebuilt when its levels or
+separation energies changed since it was stored, so running it again (e.g. after a new data bundle) only
+redoes the nuclides whose data changed. Use --force to rebuild everything.
+
+Levels only come from the data bundle (see build_data_bundle.py), so build that first: requesting the levels
+of every nuclide from IAEA here would bypass the rate limit of its crawler.
+
+Example (e.g. during a docker build):
+    python build_level_schemes.py --workers 4
+'''
+
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import iaea_data as iaea
+from level_scheme_store import (LEVEL_SCHEME_STORE_PATH, LevelSchemeStore, known_jp_levels, has_levels,
+                                level_scheme_key, build_level_scheme)
+
+logger = logging.getLogger('build_level_schemes')
+
+MISSING_BUNDLE = 'No data bundle with the levels of every nuclide, build it first with build_data_bundle.py'
+
+
+def build_nuclide(z, n, symbol, storedKey):
+    '''
+    Builds the level scheme of nuclide (z, n) from the data bundle unless storedKey is still up to date.
+    Returns (nuclide, key, figure JSON), the figure is None when nothing was built (the level scheme is up to date)
+    and the key too when the nuclide has no levels to show.
+    '''
+    nuclide = f'{z+n}{symbol}'
+    # The bundle is complete (see bundled_levels), so a nuclide missing from it has no levels
+    levels = known_jp_levels(iaea.get_level_store().levels(z, n))
+    if not has_levels(levels):
+        return nuclide, None, None
+    isotope = iaea.ground_state_row(z, n)
+    key = level_scheme_key(isotope, levels)
+    if key == storedKey:
+        return nuclide, key, None
+    return nuclide, key, build_level_scheme(isotope, levels)
+
+def bundled_levels():
+    '''Whether the data bundle holds the levels of every nuclide'''
+    store = iaea.get_level_store()
+    return store is not None and 'levels' in store and bool(store.meta.get('complete_levels'))
+
+def build_level_schemes(path=LEVEL_SCHEME_STORE_PATH, workers=None, force=False, batch=100):
+    '''Builds the level schemes which are missing or out of date, returns the list of nuclides that failed'''
+    # All level schemes are built from one consistent dataset, so don't refresh it from IAEA meanwhile
+    iaea.GROUND_STATE_REFRESH = False
+    if not bundled_levels():
+        raise RuntimeError(MISSING_BUNDLE)
+    groundState = iaea.preload_ground_state()
+    store = LevelSchemeStore(path)
+    storedKeys = {} if force else store.keys()
+
+    nuclides = list(zip(groundState['z'].astype(int), groundState['n'].astype(int), groundState['symbol'].astype(str)))
+    logger.info('Building level schemes of %d nuclides (%d stored)', len(nuclides), len(storedKeys))
+    failed, empty, built, entries = [], [], 0, []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_nuclide, z, n, symbol, storedKeys.get(f'{z+n}{symbol}')): f'{z+n}{symbol}'
+                   for z, n, symbol in nuclides}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                nuclide, key, figureJson = future.result()
+            except Exception as e:
+                logger.error('Failed to build the level scheme of %s: %s', futures[future], e)
+                failed.append(futures[future])
+                continue
+            if key is None:
+                empty.append(nuclide)
+            elif figureJson is not None:
+                entries.append((nuclide, key, figureJson))
+                built += 1
+            if len(entries) >= batch:
+                store.put_many(entries)
+                entries = []
+            if done % 100 == 0:
+                logger.info('%d/%d nuclides', done, len(futures))
+    store.put_many(entries)
+    # Nuclides which no longer have levels to show are dropped, the app shows a message instead of their level scheme
+    store.remove([nuclide for nuclide in empty if nuclide in storedKeys])
+    logger.info('Built %d level schemes, %d up to date, %d without levels',
+                built, len(nuclides) - built - len(empty) - len(failed), len(empty))
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the level schemes of the Nuclear Building Blocks app.')
+    parser.add_argument('--output', default=LEVEL_SCHEME_STORE_PATH, help='Location of the store (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='Rebuild all level schemes, even those which are up to date')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if not bundled_levels():
+        logger.error(MISSING_BUNDLE)
+        raise SystemExit(1)
+    failed = build_level_schemes(args.output, args.workers, args.force)
+    if failed:
+        logger.error('%d level schemes failed, run again to retry them', len(failed))
+        raise SystemExit(1)
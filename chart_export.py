@@ -0,0 +1,164 @@
+'''
+This file contains the export service rendering the app's figures (nuclear chart and level scheme) as
+svg, png or pdf files.
+
+Renders run on a background thread of each worker with a Kaleido renderer which is started once (and
+warmed up with a blank figure) instead of on the request thread, so an export never blocks the worker
+from answering other users. The browser starts an export and then polls for it (see app.py).
+
+Exports are cached on disk by a hash of the figure, format and size, so the same figure is only ever
+rendered once. The cache directory is shared by all workers, which is also how an export started on one
+worker is found when the poll lands on another one: a job is done once its file exists.
+
+Settings (environment variables):
+ - EXPORT_CACHE_PATH:    Directory of the exported files (default: cache/exports next to this file)
+ - EXPORT_CACHE_MAX_MB:  Maximum size of the cached exports before the oldest are removed (default: 100)
+'''
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly.io as pio
+import plotly.utils
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CACHE_PATH = os.environ.get('EXPORT_CACHE_PATH',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)),'cache','exports'))
+EXPORT_CACHE_MAX_MB = float(os.environ.get('EXPORT_CACHE_MAX_MB', 100))
+
+EXPORT_FORMATS = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+}
+
+JOB_ID = re.compile(r'[0-9a-f]{40}') # Job ids are figure hashes (see figure_hash)
+
+
+def figure_hash(figure, format, width, height):
+    '''Hash identifying an export of a figure (a go.Figure or figure dict)'''
+    if hasattr(figure, 'to_plotly_json'):
+        figure = figure.to_plotly_json()
+    data = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder, sort_keys=True)
+    return hashlib.sha1(f'{format}:{width}x{height}:{data}'.encode()).hexdigest()
+
+
+class ExportService:
+    '''Renders figures on a background thread and keeps the results in a disk cache'''
+    def __init__(self, path=EXPORT_CACHE_PATH, max_mb=EXPORT_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024**2)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # Threads don't survive fork(), so each worker starts (and warms up) its own renderer thread
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart_export')
+                self._pid = os.getpid()
+                self._pool.submit(self._warm_up)
+            return self._pool
+
+    def _warm_up(self):
+        try:
+            pio.to_image({'data': [], 'layout': {}}, format='svg', width=10, height=10, validate=False)
+        except Exception as e:
+            logger.warning('Could not start the export renderer: %s', e)
+
+    @staticmethod
+    def is_job(jobId, format):
+        '''Whether jobId and format can name an export (they come from the browser, so they're never trusted)'''
+        return isinstance(jobId, str) and JOB_ID.fullmatch(jobId) is not None and format in EXPORT_FORMATS
+
+    def file(self, jobId, format):
+        '''Path of an export, raises ValueError for anything but a job id and known format'''
+        if not self.is_job(jobId, format):
+            raise ValueError(f'Unknown export {jobId!r}.{format!r}')
+        return os.path.join(self.path, f'{jobId}.{format}')
+
+    def submit(self, figure, format, width, height):
+        '''Starts rendering a figure (unless it's already cached or rendering), returns the id of the job'''
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f'Unknown export format {format!r}, use one of {", ".join(EXPORT_FORMATS)}')
+        jobId = figure_hash(figure, format, width, height)
+        if not os.path.exists(self.file(jobId, format)):
+            os.makedirs(self.path, exist_ok=True)
+            if os.path.exists(self.file(jobId, format) + '.error'): # Try failed exports again
+                os.remove(self.file(jobId, format) + '.error')
+            self._executor().submit(self._render, jobId, figure, format, width, height)
+        return jobId
+
+    def _render(self, jobId, figure, format, width, height):
+        path = self.file(jobId, format)
+        if os.path.exists(path): # Rendered meanwhile (e.g. the same export was started twice)
+            return
+        started = time.perf_counter()
+        try:
+            content = pio.to_image(figure, format=format, width=width, height=height, validate=False)
+        except Exception as e:
+            logger.error('Export %s.%s failed: %s', jobId, format, e)
+            with open(path + '.error', 'w') as f:
+                f.write(str(e))
+            return
+        tempPath = path + '.tmp{}'.format(os.getpid())
+        with open(tempPath, 'wb') as f:
+            f.write(content)
+        os.replace(tempPath, path) # Pollers never see a partially written file
+        logger.info('Exported %s.%s in %.2f s', jobId, format, time.perf_counter() - started)
+        self.evict()
+
+    def result(self, jobId, format):
+        '''
+        Returns the exported file's content once the job is done, None while it's still rendering.
+        Raises RuntimeError if rendering failed, ValueError if there is no such job.
+        '''
+        path = self.file(jobId, format)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            if os.path.exists(path + '.error'):
+                with open(path + '.error') as f:
+                    raise RuntimeError(f.read())
+            return None
+        os.utime(path) # Keep recently downloaded exports in the cache
+        return content
+
+    def export(self, figure, format, width, height, timeout=60):
+        '''Renders a figure and waits for the result (for scripts, the app polls instead)'''
+        jobId = self.submit(figure, format, width, height)
+        deadline = time.monotonic() + timeout
+        while (content := self.result(jobId, format)) is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Export {jobId}.{format} took longer than {timeout} s')
+            time.sleep(0.05)
+        return content
+
+    def evict(self):
+        '''Removes the least recently used exports until the cache fits in max_bytes'''
+        try:
+            files = [entry for entry in os.scandir(self.path) if entry.is_file()]
+        except FileNotFoundError:
+            return
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+# Export service shared by the callbacks of this worker
+export_service = ExportService()
@@ -0,0 +1,9 @@
+'''
+gunicorn settings of the app, read by gunicorn from the working directory (see Procfile and Dockerfile).
+The command line options there (workers, preload, ...) are kept as they are, this file only adds server hooks.
+'''
+
+def post_fork(server, worker):
+    # The ground state data was preloaded before forking, refresh it here if it's stale (see iaea_data.preload_ground_state)
+    import iaea_data as iaea
+    iaea.start_worker_refresh()
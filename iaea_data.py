@@ -8,55 +8,416 @@ Written by:
 
 import pandas as pd
 import numpy as np
-import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import os
+import threading
+import fcntl
+import gc
+import hashlib
+import logging
+
+from level_cache import LevelCache
+from level_store import open_level_store
+from nuclide_grid import NuclideGrid, NuclideIndex
+from spin_parity import spin_parity_columns
+
+logger = logging.getLogger(__name__)
+
+# Settings for requests to the IAEA site (environment variables)
+IAEA_CONNECT_TIMEOUT = float(os.environ.get('IAEA_CONNECT_TIMEOUT', 5))   # Seconds to establish a connection
+IAEA_READ_TIMEOUT = float(os.environ.get('IAEA_READ_TIMEOUT', 20))        # Seconds to wait for data on an open connection
+IAEA_RETRIES = int(os.environ.get('IAEA_RETRIES', 2))                     # Retries for failed connections and 429/5xx replies
+IAEA_POOL_SIZE = int(os.environ.get('IAEA_POOL_SIZE', 8))                 # Kept-alive connections per process
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def _http_session():
+    '''
+    Returns this process' requests.Session. It keeps connections to nds.iaea.org alive between calls and
+    retries failed connections and 429/5xx replies with jittered exponential backoff. A new session is made
+    after fork() since pooled sockets can't be shared between workers.
+    '''
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            retry = Retry(total=IAEA_RETRIES, backoff_factor=0.5, backoff_jitter=0.5,
+                          status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'],
+                          respect_retry_after_header=True)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=IAEA_POOL_SIZE, max_retries=retry)
+            _session = requests.Session()
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _session.headers['User-Agent'] = 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:77.0) Gecko/20100101 Firefox/77.0'
+            _session_pid = os.getpid()
+        return _session
+
+# Validators (ETag/Last-Modified) and parsed data of recent responses, used for conditional requests
+_validated = OrderedDict()
+_validated_lock = threading.Lock()
+_VALIDATED_MAX = 32
 
 # For gathering specific data from IAEA site...
 def lc_pd_dataframe(url):
-    req = urllib.request.Request(url)
-    req.add_header('User-Agent', 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:77.0) Gecko/20100101 Firefox/77.0')
-    return pd.read_csv(urllib.request.urlopen(req))
+    '''
+    Reads the csv data at url into a DataFrame. The response is streamed straight into pandas and requests
+    are bounded by IAEA_CONNECT_TIMEOUT/IAEA_READ_TIMEOUT. When the server sent an ETag or Last-Modified for
+    the url before, the request is conditional and an unchanged (304) reply reuses the previous DataFrame.
+    '''
+    headers = {}
+    with _validated_lock:
+        previous = _validated.get(url)
+    if previous is not None:
+        if previous['etag']:
+            headers['If-None-Match'] = previous['etag']
+        if previous['last_modified']:
+            headers['If-Modified-Since'] = previous['last_modified']
 
-# the service URL for the IAEA nuclear chart
-livechart = "https://nds.iaea.org/relnsd/v0/data?"
+    with _http_session().get(url, headers=headers, stream=True,
+                             timeout=(IAEA_CONNECT_TIMEOUT, IAEA_READ_TIMEOUT)) as response:
+        if response.status_code == 304 and previous is not None:
+            return previous['data'].copy()
+        response.raise_for_status()
+        response.raw.decode_content = True # Let urllib3 undo any gzip encoding while pandas reads
+        data = pd.read_csv(response.raw)
+        etag, lastModified = response.headers.get('ETag'), response.headers.get('Last-Modified')
 
+    if etag or lastModified:
+        with _validated_lock:
+            _validated[url] = {'etag': etag, 'last_modified': lastModified, 'data': data.copy()}
+            _validated.move_to_end(url)
+            while len(_validated) > _VALIDATED_MAX:
+                _validated.popitem(last=False)
+    return data
 
-# -----------------------------------------
-# |  Collect ground state data on import  |
-# -----------------------------------------
-
-# Collecting all ground state data
-ground_state = lc_pd_dataframe(livechart + "fields=ground_states&nuclides=all")
+# the service URL for the IAEA nuclear chart
+livechart = "https://nds.iaea.org/relnsd/v0/data?"
 
-# Convert string data to int
-ground_state['n'] = ground_state['n'].astype(int)
-ground_state['z'] = ground_state['z'].astype(int)
 
-# Create html formatted name for nucleus
-ground_state['A_symbol'] = ['<sup>'+str(row['n']+row['z'])+'</sup>'+row['symbol'] for index,row in ground_state.iterrows()]
+# Ground state data shipped with the repository (same format as the processed IAEA data or the raw livechart csv),
+# used at start up so that no network access is needed before the app can serve. It is never written at runtime.
+SHIPPED_GROUND_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),'local_storage_iaea_data.csv')
+# Snapshot of the last ground state data downloaded from IAEA, its modification time is when it was fetched
+GROUND_STATE_PATH = os.environ.get('IAEA_GROUND_STATE_PATH',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)),'cache','ground_state.csv'))
+# Days since the data was last fetched (or extracted by IAEA, for data which wasn't fetched by this app) after which
+# it is refreshed from IAEA in the background
+GROUND_STATE_MAX_AGE_DAYS = float(os.environ.get('IAEA_GROUND_STATE_MAX_AGE_DAYS', 90))
+# Set to 0 to never contact IAEA for ground state data (e.g. fully offline deployments)
+GROUND_STATE_REFRESH = os.environ.get('IAEA_GROUND_STATE_REFRESH', '1') != '0'
 
 # Dictionary to rewrite more exotic decays with their initial decay step
 decayOrder = {'EC+B+':'EC','B+P':'B+','B-N':'B-','B-2N':'B-','B-A':'B-','ECP+EC2P':'EC','2EC':'EC',
             'IT':'B-','ECP':'EC','2B-':'B-','2B+':'B+','ECSF':'SF',' ':'Not Available'} # Adjust to more common decays
 
-for i, row in ground_state.iterrows():
-    # Convert data to log scale
+def process_ground_state(ground_state):
+    '''
+    Given the raw ground state DataFrame from the IAEA livechart, returns the DataFrame used for display with the added columns:
+     - A_symbol:           HTML formatted isotope name as <sup>{A}</sup>Symbol (e.g. <sup>4</sup>He for Helium-4)
+     - log(half_life_sec): Log of a nucleus' half life in seconds
+     - common_decays:      Reduced set of decay modes reducing everything to the most common mode
+    '''
+    # Convert string data to int
+    ground_state['n'] = ground_state['n'].astype(int)
+    ground_state['z'] = ground_state['z'].astype(int)
+
+    # Create html formatted name for nucleus
+    ground_state['A_symbol'] = '<sup>' + (ground_state['n']+ground_state['z']).astype(str) + '</sup>' + ground_state['symbol']
+
+    # Convert data to log scale (entries which can't be read as a number are set to 0)
+    halfLifeSec = pd.to_numeric(ground_state['half_life_sec'], errors='coerce')
+    notNumber = halfLifeSec.isna() & ground_state['half_life_sec'].notna()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ground_state['log(half_life_sec)'] = np.log10(halfLifeSec.mask(notNumber, 1.0).astype(float))
+
+    # Store the more common decays in a new column (decays not in decayOrder are kept as they are)
+    ground_state['common_decays'] = ground_state['decay_1'].map(decayOrder).fillna(ground_state['decay_1'])
+    ground_state.loc[ground_state['half_life']=='STABLE','common_decays'] = 'Stable'
+
+    # For displaying data, check if any rows contain nan for all quantities, the considered columns are:
+    # 'binding', 'sn', 'sp' as we hope that there should be values reported for at least one of these quantities!
+    ground_state = ground_state[~(np.isnan(ground_state['binding']) & np.isnan(ground_state['sp']) &
+                                  np.isnan(ground_state['sn']) & np.isnan(ground_state['massexcess']))]
+    return ground_state
+
+def fetch_ground_state():
+    '''Collects all ground state data from the IAEA livechart and processes it for display'''
+    return process_ground_state(lc_pd_dataframe(livechart + "fields=ground_states&nuclides=all"))
+
+def read_ground_state_snapshot(path=GROUND_STATE_PATH):
+    '''Reads a local ground state snapshot (either raw livechart csv or one written by save_ground_state_snapshot)'''
+    ground_state = pd.read_csv(path, index_col=0)
+    # Snapshots saved by this module are already processed, raw livechart files still need the extra columns
+    if 'common_decays' not in ground_state.columns:
+        ground_state = process_ground_state(ground_state)
+    return ground_state
+
+def save_ground_state_snapshot(ground_state, path=GROUND_STATE_PATH):
+    '''Atomically replaces the local snapshot so other workers never read a partially written file'''
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tempPath = path + '.tmp{}'.format(os.getpid())
+    ground_state.to_csv(tempPath)
+    os.replace(tempPath, path)
+
+def snapshot_fetch_time(path=GROUND_STATE_PATH):
+    '''When the snapshot at path was downloaded from IAEA (its modification time), NaT if there is none'''
     try:
-        ground_state.loc[i,'log(half_life_sec)'] = np.log10(float(row['half_life_sec']))
-    except:
-        ground_state.loc[i,'log(half_life_sec)'] = 0
-    
-    # Store the more common decays in a new column
+        return pd.Timestamp(os.path.getmtime(path), unit='s')
+    except OSError:
+        return pd.NaT
+
+def extraction_date(ground_state):
+    '''Latest IAEA extraction date in the data (NaT if unknown)'''
+    # The compact ground state stores it as a category, which has no max()
+    return pd.to_datetime(ground_state['Extraction_date'].astype(object), errors='coerce').max()
+
+def snapshot_age_days(ground_state, fetched=pd.NaT):
+    '''
+    Returns the number of days since the data was fetched from IAEA, or since its IAEA extraction date if that
+    is later (e.g. for data which wasn't fetched by this app), None if neither is known
+    '''
+    updated = pd.Series([extraction_date(ground_state), fetched], dtype='datetime64[ns]').max()
+    if pd.isna(updated):
+        return None
+    return (pd.Timestamp.now() - updated).total_seconds() / 86400
+
+def ground_state_is_stale(ground_state, max_age_days=GROUND_STATE_MAX_AGE_DAYS, fetched=pd.NaT):
+    age = snapshot_age_days(ground_state, fetched)
+    return age is None or age > max_age_days
+
+_refresh_lock = threading.Lock()
+_loaded_fetch_time = pd.NaT # Fetch time of the snapshot when this process' data was loaded
+
+@contextmanager
+def snapshot_lock(path=GROUND_STATE_PATH):
+    '''Held (across processes) while the snapshot at path is refreshed, other processes block until it's released'''
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        lockFile = open(path + '.lock', 'a')
+    except OSError as e: # e.g. read-only containers, every process refreshes on its own
+        logger.warning('Could not lock ground state snapshot %s: %s', path, e)
+        yield
+        return
+    with lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+def refresh_ground_state(path=GROUND_STATE_PATH):
+    '''
+    Refreshes the ground state data of this process. Only one process (e.g. one of the gunicorn workers) downloads
+    the current IAEA data and stores it as the new local snapshot, the others wait for it and then reload that
+    snapshot. Failures (e.g. no network) are logged and the existing data is kept.
+    '''
+    global _ground_state, _loaded_fetch_time
+    if not _refresh_lock.acquire(blocking=False): # A refresh is already running in this process
+        return
     try:
-        ground_state.loc[i,'common_decays'] = decayOrder[row['decay_1']]
-    except:
-        ground_state.loc[i,'common_decays'] = row['decay_1']
-ground_state.loc[ground_state['half_life']=='STABLE','common_decays'] = 'Stable'
+        with snapshot_lock(path):
+            fetched = snapshot_fetch_time(path)
+            if not pd.isna(fetched) and (pd.isna(_loaded_fetch_time) or fetched > _loaded_fetch_time):
+                # Another process refreshed the snapshot since this one loaded its data
+                newGroundState = read_ground_state_snapshot(path)
+            else:
+                newGroundState = fetch_ground_state()
+                try:
+                    save_ground_state_snapshot(newGroundState, path)
+                    fetched = snapshot_fetch_time(path)
+                except OSError as e: # Read-only containers can still use the refreshed data in memory
+                    logger.warning('Could not save ground state snapshot to %s: %s', path, e)
+        _ground_state = compact_ground_state(newGroundState)
+        _loaded_fetch_time = fetched
+    except Exception as e:
+        logger.warning('Could not refresh ground state data from IAEA, keeping local data: %s', e)
+    finally:
+        _refresh_lock.release()
+
+def start_background_refresh(path=GROUND_STATE_PATH):
+    threading.Thread(target=refresh_ground_state, args=(path,), daemon=True, name='ground-state-refresh').start()
+
+def read_bundled_ground_state():
+    '''Returns the ground state table of the data bundle (see build_data_bundle.py), None if there isn't one'''
+    store = get_level_store()
+    if store is None or 'ground_states' not in store:
+        return None
+    return store['ground_states'].frame()
+
+def load_ground_state(path=GROUND_STATE_PATH, max_age_days=GROUND_STATE_MAX_AGE_DAYS, refresh=GROUND_STATE_REFRESH):
+    '''
+    Loads the ground state data from the last downloaded snapshot (or the shipped data if nothing was downloaded yet)
+    or the data bundle, whichever is newer. If it is older than max_age_days, a background thread refreshes it from
+    IAEA while the local data is served. Only when there is no local data at all do we block on IAEA.
+    '''
+    global _loaded_fetch_time
+    snapshot = None
+    for snapshotPath in [path, SHIPPED_GROUND_STATE_PATH]:
+        if not os.path.exists(snapshotPath):
+            continue
+        try:
+            snapshot = read_ground_state_snapshot(snapshotPath)
+            break
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning('Could not read ground state snapshot %s: %s', snapshotPath, e)
+    bundled = read_bundled_ground_state()
+    # Prefer the bundle (built together with the level data) unless the snapshot has been refreshed since
+    if bundled is not None and (snapshot is None or not (extraction_date(snapshot) > extraction_date(bundled))):
+        snapshot = bundled
+
+    if snapshot is None:
+        logger.warning('No local ground state data, loading from IAEA')
+        snapshot = fetch_ground_state()
+        try:
+            save_ground_state_snapshot(snapshot, path)
+        except OSError:
+            pass
+        return snapshot
 
+    _loaded_fetch_time = snapshot_fetch_time(path)
+    if refresh and ground_state_is_stale(snapshot, max_age_days, _loaded_fetch_time):
+        start_background_refresh(path)
+    return snapshot
 
-# For displaying data, check if any rows contain nan for all quantities, the considered columns are:
-# 'binding', 'sn', 'sp' as we hope that there should be values reported for at least one of these quantities!
-ground_state = ground_state[~(np.isnan(ground_state['binding']) & np.isnan(ground_state['sp']) &
-                              np.isnan(ground_state['sn']) & np.isnan(ground_state['massexcess']))]
+# ------------------------------------------
+# |  Lazily loaded ground state dataset    |
+# ------------------------------------------
+
+# Columns (and their types) of the ground state data kept in memory, these are the only ones used by the app.
+# Every worker holds this table, so the ~60 IAEA columns are cut down and stored in the smallest types that
+# keep enough precision for display. Use load_full_ground_state() when the other columns are needed.
+GROUND_STATE_SCHEMA = {
+    'z': 'int16',
+    'n': 'int16',
+    'symbol': 'category',
+    'A_symbol': 'object',
+    'half_life': 'object',           # 'STABLE', a value or NaN (unknown)
+    'log(half_life_sec)': 'float32',
+    'decay_1': 'category',
+    'common_decays': 'category',
+    'binding': 'float32',            # keV, float32 keeps ~7 significant digits
+    'sn': 'float32',
+    'sp': 'float32',
+    'massexcess': 'float32',
+    'discovery': 'float32',
+    'Extraction_date': 'category',   # Needed to check if the data is stale
+}
+
+def compact_ground_state(ground_state):
+    '''Reduces a processed ground state DataFrame to the columns and types of GROUND_STATE_SCHEMA'''
+    return ground_state[list(GROUND_STATE_SCHEMA)].astype(GROUND_STATE_SCHEMA)
+
+def load_full_ground_state():
+    '''Loads all IAEA ground state columns (not kept in memory, use get_ground_state() for the app's data)'''
+    return load_ground_state(refresh=False)
+
+_ground_state = None
+_ground_state_lock = threading.Lock()
+_refresh_in_workers = False # The preloaded snapshot is stale, refresh it once the app workers are forked
+
+def get_ground_state():
+    '''Returns the (compact) ground state dataset, loading it on first use (only once per process)'''
+    global _ground_state
+    if _ground_state is None:
+        with _ground_state_lock:
+            if _ground_state is None:
+                _ground_state = compact_ground_state(load_ground_state())
+    return _ground_state
+
+_nuclide_grid = (None, None) # (ground state DataFrame the grid was built from, NuclideGrid)
+
+def get_nuclide_grid():
+    '''Returns the NuclideGrid of the current ground state data, built once (and again after a refresh)'''
+    global _nuclide_grid
+    groundState = get_ground_state()
+    source, grid = _nuclide_grid
+    if source is not groundState:
+        grid = NuclideGrid.from_dataframe(groundState)
+        _nuclide_grid = (groundState, grid)
+    return grid
+
+_nuclide_index = (None, None) # (ground state DataFrame the index was built from, NuclideIndex)
+
+def indexed_ground_state():
+    '''Returns the current ground state data along with its NuclideIndex, built once (and again after a refresh)'''
+    global _nuclide_index
+    groundState = get_ground_state()
+    source, index = _nuclide_index
+    if source is not groundState:
+        index = NuclideIndex.from_dataframe(groundState)
+        _nuclide_index = (groundState, index)
+    return groundState, index
+
+def get_nuclide_index():
+    return indexed_ground_state()[1]
+
+def ground_state_row(z, n):
+    '''Ground state data of nuclide (z, n) as a one row DataFrame, None if it isn't in the data'''
+    groundState, index = indexed_ground_state()
+    row = index.row(z, n)
+    return None if row is None else groundState.iloc[[row]]
+
+_data_version = (None, None) # (ground state DataFrame the version was computed from, version string)
+
+def get_data_version():
+    '''
+    Short content hash of the ground state data. It is the same in every worker serving the same data and
+    changes when the data is refreshed, so it can be used in cache keys.
+    '''
+    global _data_version
+    groundState = get_ground_state()
+    source, version = _data_version
+    if source is not groundState:
+        rowHashes = pd.util.hash_pandas_object(groundState, index=False).to_numpy()
+        version = hashlib.sha1(rowHashes.tobytes()).hexdigest()[:12]
+        _data_version = (groundState, version)
+    return version
+
+def preload_ground_state():
+    '''
+    Loads the ground state dataset (and its NuclideGrid and NuclideIndex) and freezes it before gunicorn forks its workers (run with --preload).
+    gc.freeze() moves everything allocated so far into the permanent generation, so the garbage collector
+    never writes to those objects and the workers keep sharing the pages copy-on-write.
+    A stale snapshot is refreshed after the fork since threads don't survive fork(): gunicorn calls
+    start_worker_refresh() in each app worker (see gunicorn.conf.py), one of them downloads it and the others
+    reload the snapshot it wrote (see refresh_ground_state()). Other forked processes (e.g. the process pools
+    of the build_*.py tools) never refresh it.
+    '''
+    global _ground_state, _refresh_in_workers
+    with _ground_state_lock:
+        if _ground_state is None:
+            _ground_state = compact_ground_state(load_ground_state(refresh=False))
+            _refresh_in_workers = GROUND_STATE_REFRESH and ground_state_is_stale(_ground_state, fetched=_loaded_fetch_time)
+    get_nuclide_grid()
+    get_nuclide_index()
+    get_data_version()
+    gc.collect()
+    gc.freeze()
+    return _ground_state
+
+def start_worker_refresh():
+    '''Refreshes a stale preloaded snapshot in the background, called in each forked app worker (see gunicorn.conf.py)'''
+    if _refresh_in_workers:
+        start_background_refresh()
+
+def _after_fork_in_child():
+    global _refresh_lock
+    _refresh_lock = threading.Lock() # The parent may have forked while holding the lock
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def __getattr__(name):
+    # Keeps 'iaea_data.ground_state' working for existing code while loading lazily
+    if name == 'ground_state':
+        return get_ground_state()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # # For collecting all ground state information in the nuclear chart
 # def NuChartGS():
@@ -86,5 +447,101 @@ ground_state = ground_state[~(np.isnan(ground_state['binding']) & np.isnan(groun
 #     ground_state.loc[ground_state['half_life']=='STABLE','common_decays'] = 'Stable'
 #     return ground_state
 
+class SingleFlight:
+    '''
+    Coalesces concurrent calls for the same key: the first caller runs the function while later callers
+    wait for it and share its result, or get the same exception raised if it fails.
+    '''
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock() # Only guards the table of in-flight calls, each key waits on its own event
+        self._calls = {}
+        self.coalesced = 0 # Number of calls which were served by another caller's in-flight call
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+# Persistent cache of level schemes shared by all workers (see level_cache.py for settings)
+level_cache = LevelCache()
+# Concurrent requests in this process for the same nuclide share a single lookup/fetch
+level_requests = SingleFlight()
+
+_level_store = None
+_level_store_checked = False
+
+def get_level_store():
+    '''Returns the memory-mapped bulk level store (see level_store.py), None if it hasn't been built'''
+    global _level_store, _level_store_checked
+    if not _level_store_checked:
+        try:
+            _level_store = open_level_store()
+        except (OSError, ValueError) as e:
+            logger.warning('Could not open level store: %s', e)
+        _level_store_checked = True
+    return _level_store
+
 def NuChartLevels(A_,symbol_):
-    return lc_pd_dataframe(livechart + "fields=levels&nuclides={}{}".format(A_,symbol_))
\ No newline at end of file
+    '''
+    Returns the levels of a nuclide as a DataFrame. Callers requesting the same nuclide at the same
+    time share one DataFrame, so it must not be modified in place.
+
+    Levels come from the bulk level store when it has them, otherwise from the level cache / IAEA.
+    '''
+    store = get_level_store()
+    if store is not None and 'levels' in store:
+        nuclide = store.find(A_,symbol_)
+        # A complete bundle also knows which nuclides have no levels, so those don't need IAEA either
+        if (nuclide is not None) and (store['levels'].has(*nuclide) or store.meta.get('complete_levels')):
+            return store.levels(*nuclide)
+
+    nuclide = '{}{}'.format(A_,symbol_)
+    return level_requests.do((int(A_), symbol_), lambda: level_cache.get_or_fetch(
+        nuclide, lambda: lc_pd_dataframe(livechart + "fields=levels&nuclides={}".format(nuclide))))
+
+_level_spin_parity = None
+
+def level_spin_parity():
+    '''
+    Parsed J^pi of every level in the bulk level store (see spin_parity.py) as a DataFrame with the columns z, n,
+    energy and the structured J^pi columns, parsed once per process. None if the store has no levels.
+    Used for chart-wide spin statistics, e.g. spin_parity.spin_parity_counts(table['two_j'], table['parity']).
+    '''
+    global _level_spin_parity
+    if _level_spin_parity is None:
+        store = get_level_store()
+        if store is None or 'levels' not in store:
+            return None
+        columns = store['levels'].columns
+        _level_spin_parity = pd.DataFrame({'z': columns['z'], 'n': columns['n'], 'energy': columns['energy'],
+                                           **spin_parity_columns(columns['jp'])})
+    return _level_spin_parity
+
+def coalesced_level_fetches():
+    '''Number of level scheme requests which were served by an identical in-flight request'''
+    return level_requests.coalesced
@@ -0,0 +1,129 @@
+'''
+This file contains the web-optimized derivatives of the app's images (decay mode pictures shown in the
+nuclear chart tooltip, pictures of built nuclei and logos shown on the built nucleus card).
+
+Every image is resized to the width of a size bucket and compressed as WebP. Derivatives are named after
+a hash of the original's content and the bucket ({name}-{bucket}-{hash}.webp), so they never change once
+written and are served with a long-lived immutable Cache-Control header from /img/.
+
+Derivatives are normally generated during the build (see build_image_derivatives.py), which also writes
+a manifest.json describing them. At runtime image_src() returns the derivative URL of an image, making
+missing derivatives on the fly if Pillow is installed and falling back to the original image otherwise.
+
+Settings (environment variables):
+ - DERIVED_IMAGE_PATH: Directory of the derivatives (default: derived_images next to this file)
+'''
+
+import os
+import json
+import hashlib
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DERIVED_IMAGE_PATH = os.environ.get('DERIVED_IMAGE_PATH',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)),'derived_images'))
+DERIVED_IMAGE_URL = 'img/'
+MANIFEST_NAME = 'manifest.json'
+
+# Width (px) of each size bucket
+SIZES = {
+    'tooltip': 300,
+    'card': 800,
+}
+WEBP_QUALITY = 80
+DERIVATIVE_VERSION = 1 # Bump when the encoding changes so all derivatives get new names
+CACHE_MAX_AGE = 365*24*3600
+
+_sources = {} # (original path, bucket) -> src, so each image is only looked up once per worker
+_sources_lock = threading.Lock()
+_manifest = None
+
+
+def derivative_name(source, size):
+    '''File name of the derivative of an image in a size bucket, from a hash of its content'''
+    digest = hashlib.sha1(f'{DERIVATIVE_VERSION}:{SIZES[size]}:{WEBP_QUALITY}:'.encode())
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f'{stem}-{size}-{digest.hexdigest()[:12]}.webp'
+
+def write_derivative(source, size, directory=DERIVED_IMAGE_PATH):
+    '''Writes the derivative of an image (if it doesn't exist yet) and returns its file name, needs Pillow'''
+    from PIL import Image, ImageOps # Optional dependency, only needed to make derivatives
+
+    name = derivative_name(source, size)
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return name
+    os.makedirs(directory, exist_ok=True)
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        width = SIZES[size]
+        if image.width > width: # Only ever scale down
+            image = image.resize((width, max(1, round(image.height*width/image.width))), Image.LANCZOS)
+        tempPath = path + '.tmp{}'.format(os.getpid())
+        image.save(tempPath, 'WEBP', quality=WEBP_QUALITY, method=4)
+    os.replace(tempPath, path) # Other workers never serve a partially written file
+    return name
+
+
+def read_manifest(directory=DERIVED_IMAGE_PATH):
+    '''Returns the manifest written by build_image_derivatives.py, an empty one if there is none'''
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def manifest_entry(source, derivatives):
+    '''Manifest entry of an image, the original's size and mtime tell if the derivatives are still current'''
+    stat = os.stat(source)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'derivatives': derivatives}
+
+def _lookup(source, size):
+    global _manifest
+    if _manifest is None:
+        _manifest = read_manifest()
+    try:
+        entry = _manifest.get(source)
+        stat = os.stat(source)
+        if entry and (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns) and size in entry['derivatives']:
+            name = entry['derivatives'][size]
+            if os.path.exists(os.path.join(DERIVED_IMAGE_PATH, name)):
+                return DERIVED_IMAGE_URL + name
+        return DERIVED_IMAGE_URL + write_derivative(source, size)
+    except ImportError:
+        logger.info('Pillow is not installed, serving the original of %s', source)
+    except Exception as e: # A broken image or an unwritable directory should never hide the image
+        logger.warning('Could not make a %s derivative of %s: %s', size, source, e)
+    return source
+
+def image_src(source, size):
+    '''
+    Returns the src of the derivative of an image (a path relative to the app, e.g. 'assets/logo.png') in
+    the given size bucket ('tooltip' or 'card'), or the original path if no derivative can be made.
+    '''
+    key = (source, size)
+    src = _sources.get(key)
+    if src is None:
+        src = _lookup(source, size)
+        with _sources_lock:
+            _sources[key] = src
+    return src
+
+
+def register_routes(server, directory=DERIVED_IMAGE_PATH):
+    '''Serves the derivatives from /img/ with immutable, long-lived cache headers on the Flask server'''
+    import flask
+
+    @server.route('/' + DERIVED_IMAGE_URL + '<path:filename>')
+    def derived_image(filename):
+        response = flask.send_from_directory(directory, filename, max_age=CACHE_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}, immutable'
+        return response
+    return derived_image
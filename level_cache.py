@@ -0,0 +1,119 @@
+'''
+This file contains the persistent cache used for IAEA level scheme data.
+
+Levels are stored per nuclide (e.g. '12C') in a SQLite file so the cache is shared by all gunicorn
+workers and survives restarts. Entries older than the TTL are refetched, but are still served if IAEA
+can't be reached. The cache is bounded in size by evicting the least recently used nuclides.
+
+Settings (environment variables):
+ - LEVEL_CACHE_PATH:      Location of the SQLite file (default: cache/level_cache.sqlite next to this file)
+ - LEVEL_CACHE_TTL_DAYS:  Days after which an entry is refetched from IAEA (default: 30)
+ - LEVEL_CACHE_MAX_MB:    Maximum size of the stored level data before eviction (default: 200)
+'''
+
+import os
+import io
+import time
+import sqlite3
+import threading
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+LEVEL_CACHE_PATH = os.environ.get('LEVEL_CACHE_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)),'cache','level_cache.sqlite'))
+LEVEL_CACHE_TTL_DAYS = float(os.environ.get('LEVEL_CACHE_TTL_DAYS', 30))
+LEVEL_CACHE_MAX_MB = float(os.environ.get('LEVEL_CACHE_MAX_MB', 200))
+
+
+class LevelCache:
+    '''
+    SQLite backed cache of level DataFrames keyed by nuclide name.
+
+    Each process/thread opens its own connection (SQLite connections can't be shared across fork()),
+    and the database runs in WAL mode so readers in other workers aren't blocked by writers.
+    '''
+    def __init__(self, path=LEVEL_CACHE_PATH, ttl_days=LEVEL_CACHE_TTL_DAYS, max_mb=LEVEL_CACHE_MAX_MB):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_bytes = int(max_mb * 1024**2)
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS levels (
+                            nuclide TEXT PRIMARY KEY,
+                            data BLOB NOT NULL,
+                            size INTEGER NOT NULL,
+                            fetched REAL NOT NULL,
+                            accessed REAL NOT NULL)''')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, nuclide):
+        '''Returns (DataFrame, age in seconds) for a cached nuclide or None if not cached'''
+        conn = self._connect()
+        row = conn.execute('SELECT data, fetched FROM levels WHERE nuclide=?', (nuclide,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        conn.execute('UPDATE levels SET accessed=? WHERE nuclide=?', (now, nuclide))
+        return pd.read_csv(io.BytesIO(row[0])), now - row[1]
+
+    def put(self, nuclide, levels):
+        data = levels.to_csv(index=False).encode()
+        now = time.time()
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO levels (nuclide, data, size, fetched, accessed) VALUES (?,?,?,?,?)',
+                     (nuclide, data, len(data), now, now))
+        self.evict()
+
+    def evict(self):
+        '''Removes least recently used nuclides until the cache fits in max_bytes'''
+        conn = self._connect()
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM levels').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = []
+        for nuclide, size in conn.execute('SELECT nuclide, size FROM levels ORDER BY accessed'):
+            if total <= self.max_bytes:
+                break
+            removed.append((nuclide,))
+            total -= size
+        conn.executemany('DELETE FROM levels WHERE nuclide=?', removed)
+
+    def get_or_fetch(self, nuclide, fetch):
+        '''
+        Returns the cached levels of a nuclide, calling fetch() when the entry is missing or older than the TTL.
+        If fetch() fails, a stale entry is returned instead; the error is only raised when nothing is cached.
+        '''
+        try:
+            cached = self.get(nuclide)
+        except (sqlite3.Error, OSError) as e: # A broken cache should never take down the level scheme
+            logger.warning('Level cache unavailable (%s), fetching %s directly', e, nuclide)
+            return fetch()
+        if cached is not None and cached[1] < self.ttl:
+            return cached[0]
+        try:
+            levels = fetch()
+        except Exception as e:
+            if cached is None:
+                raise
+            logger.warning('Could not refresh levels for %s (%s), using cached data', nuclide, e)
+            return cached[0]
+        try:
+            self.put(nuclide, levels)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('Could not store levels for %s in cache: %s', nuclide, e)
+        return levels
+
+    def clear(self):
+        self._connect().execute('DELETE FROM levels')
@@ -7,22 +7,32 @@ Options for Level Scheme display:
 
  - show_built_nucleus:           Given a header text list and image location; returns both as html.Td() and html.Img() respectively
 
- - drawLevel:                    Given a Plotly Graph Object, x array, list of Energy, list of half life, list of half life units;
-                                 plots level scheme of all provided energies and their decay widths (if width units are in any eV)
+ - drawLevels:                   Given a Plotly Graph Object, x positions, energies, half lives and half life units of all levels;
+                                 plots all levels as one line trace and their decay widths (if width units are in any eV) as one
+                                 filled trace of NaN-separated segments/polygons
 
  - plot_level_scheme:            Given a ground state dataset and level scheme dataset as pandas dataFrames; plots all levels and
                                  their decay widths along with found separation energies
-    - Uses: drawLeveL(), plot_separation_energy()
+    - Uses: drawLevels(), plot_separation_energy()
 
  - drawGroupBox:                 Given a Plotly Graph Object, minimum X value, maximum X value, minimum Energy, maximum Energy, and an excitation ID;
                                  draws a Plotly Graph Object Scatter plot box corresponding to the excitation group spanned by the given energy (is hoverable).
 
+ - jp_columns:                   Given a level scheme dataset as a pandas dataFrame; returns the x-axis column of each level and the
+                                 J^\pi name of each column, sorted by J, parity and how tentative the assignment is
+
  - find_best_clusters:           Given a 1D numpy array of energy levels and a desired number of clusters (default 3); finds the best
                                  cluster representation for the dataset and returns them as a list
+    - Uses: optimal_1d_segments()
 
  - plot_simplified_level_scheme: Given a ground state dataset and level scheme dataset as pandas dataFrames (and optional number of clusters);
                                  plots all levels, their decay widths, separation energies, and boxes (hoverable) for the found cluster of energies
 
+ - plot_full_level_scheme:       Given a ground state dataset and level scheme dataset as pandas dataFrames (and optional visible energy and
+                                 column ranges); plots the individual levels within the visible window, or the number of levels per J^\pi
+                                 column and energy bin when there are too many of them to draw
+    - Uses: drawLevels(), plot_separation_energy()
+
 Written by:
  - Joshua Wylie
 '''
@@ -32,9 +42,15 @@ import pandas as pd
 import plotly.graph_objects as go
 from dash import html, dcc
 import dash_bootstrap_components as dbc
-from sklearn.cluster import KMeans
 import textwrap
 
+from spin_parity import add_spin_parity
+
+# Level of detail of plot_full_level_scheme: the most levels drawn individually and the number of energy bins otherwise.
+# Both are about what the level scheme graph can show at its size on screen, not how many levels are known.
+FULL_SCHEME_MAX_LEVELS = 1000
+FULL_SCHEME_ENERGY_BINS = 200
+
 levelGroupColors = ['rgba(75, 158, 214, 0.6)','rgba(255, 157, 36, 0.6)','rgba(163, 42, 205, 0.6)','rgba(200, 0, 4, 0.6)']
 
 def plot_separation_energy(fig_,s_,xMin,xMax,nucType,nucColor):
@@ -68,33 +84,54 @@ def plot_separation_energy(fig_,s_,xMin,xMax,nucType,nucColor):
         return None
     return None
 
-def drawLevel(fig_,x_,E,half_life,half_life_units,xstep=0.25):
+def level_widths(half_life,half_life_units):
     '''
-    Given: a Plotly Graph Object, x array, list of Energy, list of half life, list of half life units
-    Plots level scheme of all provided energies and their decay widths (if width units are in any eV)
+    Given arrays of half lives and half life units, returns the decay widths in MeV of the levels whose half life
+    is given as a width (units in any eV) and NaN for all others
+    '''
+    convertEV = {'eV':10**-6,'keV':10**-3,'MeV':1}
+    units = pd.Series(half_life_units).astype(str).str.replace(' ','')
+    return (pd.to_numeric(pd.Series(half_life), errors='coerce') * units.map(convertEV)).to_numpy(dtype=np.float64)
 
-    Returns min and max y values associated with level
+def drawLevels(fig_,x_,E,half_life,half_life_units,xstep=0.25):
     '''
-    E = float(E) # In MeV
-    # if half_life_units == ' ': # Old version of IAEA data, was changed to NaN
-    if pd.isna(half_life_units): # Find states with unknown half life and set them to a grey line to indicate uncertain status
-        fig_.add_shape(type='line',
-                       x0=x_-xstep, x1=x_+xstep, y0=E, y1=E,
-                       line_color='white')
-    else: # Remaining 
-        fig_.add_shape(type='line',
-                       x0=x_-xstep, x1=x_+xstep, y0=E, y1=E,
-                       line_color='white')
-        
-        # For states with a noticable decay width (keV, MeV, etc.)
-        if 'eV' in half_life_units:
-            convertEV = {'eV':10**-6,'keV':10**-3,'MeV':1}
-            G = float(half_life) * convertEV[half_life_units.replace(' ','')]
-            fig_.add_shape(type='rect',
-                           x0=x_-xstep, x1=x_+xstep, y0=E-G/2, y1=E+G/2,
-                           line_width=0, fillcolor='#e8e9eb', opacity=0.25)
-            return fig_, E-G/2, E+G/2
-    return fig_, E, E # Unknown half life wouldn't require any extra decay width box so we have this as the general-case return
+    Given: a Plotly Graph Object, arrays of x positions, Energies (MeV), half lives and half life units
+    Plots level scheme of all provided energies and their decay widths (if width units are in any eV).
+    All levels are drawn as one line trace of NaN-separated segments and all decay widths as one filled trace
+    of NaN-separated rectangles, so the figure size doesn't grow with the number of traces.
+
+    Returns min and max y values spanned by the levels
+    '''
+    x_, E = np.asarray(x_, dtype=np.float64), np.asarray(E, dtype=np.float64)
+    gap = np.full_like(E, np.nan)
+    G = level_widths(half_life,half_life_units)
+    broad = ~np.isnan(G) # For states with a noticable decay width (keV, MeV, etc.)
+
+    if broad.any():
+        x0, x1 = x_[broad]-xstep, x_[broad]+xstep
+        low, high = E[broad]-G[broad]/2, E[broad]+G[broad]/2
+        fig_.add_trace(go.Scatter(
+            x=np.column_stack([x0, x1, x1, x0, x0, gap[broad]]).ravel(),
+            y=np.column_stack([low, low, high, high, low, gap[broad]]).ravel(),
+            mode='lines',
+            fill='toself',
+            fillcolor='rgba(232, 233, 235, 0.25)', # '#e8e9eb' at 25% opacity
+            line=dict(width=0),
+            hoverinfo='skip',
+            showlegend=False,
+        ))
+    # Levels are drawn after their widths so the lines stay on top
+    fig_.add_trace(go.Scatter(
+        x=np.column_stack([x_-xstep, x_+xstep, gap]).ravel(),
+        y=np.column_stack([E, E, gap]).ravel(),
+        mode='lines',
+        line=dict(color='white',width=2),
+        hoverinfo='skip',
+        showlegend=False,
+    ))
+
+    halfWidths = np.where(broad, G/2, 0)
+    return fig_, np.nanmin(E-halfWidths), np.nanmax(E+halfWidths)
 
 
 def drawGroupBox(fig_,minX,maxX,minE,maxE,groupID):
@@ -112,43 +149,104 @@ def drawGroupBox(fig_,minX,maxX,minE,maxE,groupID):
             ))
     return None
 
-def find_best_clusters(data, num_clusters=3): # thanks ChatGPT!
+def optimal_1d_segments(sortedData, num_clusters):
     '''
-    Finds clusters in the energy levels to best describe the generic level properties.
+    Exact k-means clustering of sorted 1D data (as in Ckmeans.1d.dp). Optimal clusters of 1D data are contiguous
+    runs of the sorted values, so the best split is found by dynamic programming over the prefix sums:
+    cost[m][j] = min_i cost[m-1][i] + SSE(i, j), where SSE(i, j) is the sum of squared distances of values i..j-1
+    to their mean. The best split point only moves right as j grows, so each layer is solved by divide and
+    conquer in O(n log n) instead of O(n^2).
 
-    Requires numpy array of level energies as an input and the desired number of clusters (default 3)
+    Returns the start index of each of the num_clusters segments (the first one is always 0)
     '''
-    # Reshape data into a 2D array
-    data = np.array(data).reshape(-1, 1)
-
-    # Initialize the K-Means model with the desired number of clusters
-    kmeans = KMeans(n_clusters=num_clusters, random_state=0, n_init='auto')
-
-    # Fit the model to the data
-    kmeans.fit(data)
-
-    # Get the cluster assignments for each data point
-    labels = kmeans.labels_
-
-    # Find the cluster centers
-    cluster_centers = kmeans.cluster_centers_
+    x = np.asarray(sortedData, dtype=np.float64)
+    n = len(x)
+    s1 = np.concatenate(([0.0], np.cumsum(x)))
+    s2 = np.concatenate(([0.0], np.cumsum(x*x)))
+
+    def sse(i, j): # Sum of squared distances to the mean of the values i..j-1 (i and j can be arrays)
+        return s2[j] - s2[i] - (s1[j] - s1[i])**2 / (j - i)
+
+    ends = np.arange(n+1)
+    cost = np.full(n+1, np.inf)
+    cost[1:] = sse(0, ends[1:]) # One cluster of the first j values
+    starts = np.zeros((num_clusters, n+1), dtype=np.intp) # Start of the last segment of the best split of j values
+    for m in range(1, num_clusters):
+        # Split the first j >= m+1 values into m+1 clusters, the last one starting at i in [m, j-1].
+        # All ranges of j at the same depth of the divide and conquer are solved together, one array operation
+        # per depth: (first j, last j, lowest i, highest i) of each range
+        newCost = np.full(n+1, np.inf)
+        jLow, jHigh, iLow, iHigh = (np.array([value], dtype=np.intp) for value in (m+1, n, m, n-1))
+        while True:
+            keep = jLow <= jHigh
+            jLow, jHigh, iLow, iHigh = jLow[keep], jHigh[keep], iLow[keep], iHigh[keep]
+            if not len(jLow):
+                break
+            j = (jLow + jHigh) // 2
+            counts = np.minimum(iHigh, j-1) - iLow + 1
+            firsts = np.cumsum(counts) - counts
+            ranges = np.repeat(np.arange(len(j)), counts)
+            candidates = iLow[ranges] + np.arange(counts.sum()) - firsts[ranges]
+            values = cost[candidates] + sse(candidates, j[ranges])
+            # First candidate with the lowest value of each range
+            lowest = np.flatnonzero(values == np.minimum.reduceat(values, firsts)[ranges])
+            best = lowest[np.concatenate(([True], ranges[lowest[1:]] != ranges[lowest[:-1]]))]
+            newCost[j] = values[best]
+            starts[m, j] = best = candidates[best]
+            jLow, jHigh = np.concatenate((jLow, j+1)), np.concatenate((j-1, jHigh))
+            iLow, iHigh = np.concatenate((iLow, best)), np.concatenate((best, iHigh))
+        cost = newCost
+
+    # Walk back from the full data through the start of each segment
+    segmentStarts = [0] * num_clusters
+    j = n
+    for m in range(num_clusters-1, 0, -1):
+        j = int(starts[m, j])
+        segmentStarts[m] = j
+    return segmentStarts
+
+def find_best_clusters(data, num_clusters=3):
+    '''
+    Finds clusters in the energy levels to best describe the generic level properties.
 
-    # Calculate the sum of squared distances (inertia) for each cluster
-    cluster_inertia = [np.sum((data[labels == i] - cluster_centers[i]) ** 2) for i in range(num_clusters)]
+    Requires numpy array of level energies as an input and the desired number of clusters (default 3).
+    The clusters are the exact (deterministic) k-means solution found by optimal_1d_segments and are
+    returned as a list of arrays, ordered by their sum of squared distances to the cluster mean (inertia).
+    '''
+    data = np.sort(np.asarray(data, dtype=np.float64).ravel())
+    bounds = optimal_1d_segments(data, num_clusters) + [len(data)]
+    clusters = [data[bounds[i]:bounds[i+1]] for i in range(num_clusters)]
 
     # Sort the clusters by inertia in ascending order
-    sorted_clusters = sorted(range(num_clusters), key=lambda i: cluster_inertia[i])
+    cluster_inertia = [np.sum((cluster - cluster.mean())**2) for cluster in clusters]
+    return [clusters[i] for i in sorted(range(num_clusters), key=lambda i: cluster_inertia[i])]
 
-    # Select the top 3 clusters with the lowest inertia
-    best_clusters = [data[labels == sorted_clusters[i]].flatten() for i in range(num_clusters)]
-
-    return best_clusters
 
+def jp_columns(levels):
+    '''
+    Given a levels DataFrame (with the parsed J^pi columns of spin_parity.add_spin_parity, which are added if missing),
+    returns the x-axis position of each level and the J^pi name of each position. Each distinct J^pi string gets its
+    own column, sorted by J (unknown last), parity, firm before tentative assignments and name.
+    '''
+    if 'two_j' not in levels:
+        levels = add_spin_parity(levels)
+    codes, names = pd.factorize(levels['jp'].astype(str))
+    names = np.asarray(names, dtype=object)
+    first = np.unique(codes, return_index=True)[1] # First level of each distinct J^pi
+    twoJ = levels['two_j'].to_numpy()[first]
+    nameRank = np.unique(names.astype(str), return_inverse=True)[1]
+    # np.lexsort sorts by the last key first
+    parity = levels['parity'].to_numpy()[first]
+    order = np.lexsort((nameRank, levels['tentative'].to_numpy()[first], np.where(parity == 0, 2, parity < 0), # +, - then unknown
+                        np.where(twoJ >= 0, twoJ, np.iinfo(np.int16).max)))
+    position = np.empty(len(names), dtype=np.intp)
+    position[order] = np.arange(len(names))
+    return position[codes], list(names[order])
 
 def customwrap(s,width=30):
     return "<br>".join(textwrap.wrap(s,width=width))
 
-def plot_simplified_level_scheme(groundStateData,levelData,num_clusters=3,max_levels=50):
+def plot_simplified_level_scheme(groundStateData,levelData,num_clusters=3):
     '''
     Given two pandas DataFrames, groundStateData and levelData, which must contain the columns:
     
@@ -168,83 +266,51 @@ def plot_simplified_level_scheme(groundStateData,levelData,num_clusters=3,max_le
     
     (Optional) The number of clusters you wish to find
 
-    Returns a figure of energy levels with boxes indicating the general excitation.
+    Returns a figure of energy levels with boxes indicating the general excitation. All levels are drawn (including
+    tentative J^\pi assignments) in a fixed number of traces, so large level schemes stay fast to build and render.
     '''
     levels = levelData.copy()
-    n, z = levels['n'].unique()[0], levels['z'].unique()[0]
-    # In the event we have tons of level data, for the sake of time, we filter out to the states with known J^\pi values (i.e. drop parenthesis values)
-    if len(levels['energy']) > max_levels:
-        levels = levels[levels['jp'].str.contains('\(|\)') == False]
-    # If still more than max_levels levels, we will get rid of those with highest energy
-    levels.sort_values('energy')
-    levels = levels.head(max_levels)
+    # If only nan energies, pass error to exception display case
+    if levels['energy'].isna().all():
+        raise ValueError
+    levels = levels.dropna(subset=['energy'])
     # Get initial data
     n, z = levels['n'].unique()[0], levels['z'].unique()[0]
     levels['energy'] = levels['energy'] * 10**-3
 
     # We want x-axis positions according to the J^\pi value
-    unique_names = levels['jp'].unique() # Get unique states
+    positions, unique_names = jp_columns(levels) # Get unique states, sorted by J^\pi
     x = np.arange(len(unique_names))
     xMin, xMax = min(x)-0.5, max(x)+0.5
-    # To plot each J^\pi level in their own columns, we will save them as dictionaries with x values e.g. {'0+':0,'1+':1} and {0:'0+',1:'1+'}
-    name_to_position = {}
-    position_to_name = {}
-    for name, position in zip(unique_names, x):
-        name_to_position[str(name)] = position
-        position_to_name[position] = str(name)
-
-    # Start plotting levels like normal...
+    # Each J^\pi is plotted in its own column, we save the names of the x values e.g. {0:'0+',1:'1+'}
+    position_to_name = dict(zip(x, unique_names))
+
     fig_data = go.Figure() # Stores data separate from background groupings to avoid weird trace overlaps with boxes making things not-visible
-    # If only one level with nan energy, pass error to exception display case
-    if (len(levels['energy'])==1) and (str(levels['energy'].values[0])=='nan'):
-        raise ValueError
-    # Draw each isotope level by iterating through each row of our levels
-    yMin, yMax = 0, 0
-    for i, row in levels.iterrows():
-        # Call function to draw level (note, no hover info is assigned to these levels when just drawing lines)
-        fig_data,tempYMin, tempYMax = drawLevel(fig_data,name_to_position[str(row['jp'])],row['energy'],row['half_life'],row['unit_hl'])
-        # Check for y ranges
-        if i == 0:
-            yMin, yMax = tempYMin, tempYMax
-        if tempYMin < yMin:
-            yMin = tempYMin
-        if tempYMax > yMax:
-            yMax = tempYMax
-
-    # Plot Separation energies
-    isotope = groundStateData[(groundStateData['n']==n)&(groundStateData['z']==z)]
 
-    # Plot separation energies
+    # Plot separation energies (before the levels so those are drawn on top)
+    isotope = groundStateData[(groundStateData['n']==n)&(groundStateData['z']==z)]
     sn = isotope['sn'].values[0] * 10**-3
-    # Check for y ranges
-    if sn < yMin:
-        yMin = sn
-    if sn > yMax:
-        yMax = sn
     sp = isotope['sp'].values[0] * 10**-3
-    # Check for y ranges
-    if sp < yMin:
-        yMin = sp
-    if sp > yMax:
-        yMax = sp
     plot_separation_energy(fig_data,sn, xMin, xMax,'Neutron','blue')
     plot_separation_energy(fig_data,sp, xMin, xMax,'Proton','red')
 
+    # Draw all isotope levels at once (note, no hover info is assigned to these levels when just drawing lines)
+    fig_data, yMin, yMax = drawLevels(fig_data,positions,levels['energy'].to_numpy(),levels['half_life'].to_numpy(),levels['unit_hl'].to_numpy())
+    # Check for y ranges (nan separation energies are ignored)
+    yMin, yMax = np.nanmin([yMin, sn, sp]), np.nanmax([yMax, sn, sp])
+
     rangeE = yMax - yMin # Find total energy range
     yMin, yMax = yMin-rangeE/10,yMax+rangeE/10 # set new y-axis values with offset according to extra energy range padding
-    # Set new axes ranges
-    fig_data.update_xaxes(range=[xMin, xMax])
-    fig_data.update_yaxes(range=[yMin, yMax])
 
     # Get number of levels
     nlevels = len(levels['energy'])
 
-    # In the event we have fewer levels than clusters, the following KMeans code would fail, so we check and adjust
+    # In the event we have fewer levels than clusters, the clustering would fail, so we check and adjust
     if nlevels < num_clusters:
         num_clusters = nlevels # Set cluster number equal to number of levels if too many clusters requested
     
     fig_clusters = go.Figure() # Make another figure to allow for nice overlay to our main figure (avoid weird overlaps) of boxes and scatter points
-    # Use ChatGPT assisted function to find clusters of energies
+    # Find clusters of energies
     clusters = find_best_clusters(levels['energy'].to_numpy(),num_clusters=num_clusters)
     # Sort clusters so they move in increasing order of energy
     clusters = sorted(clusters,key=sorted)
@@ -269,20 +335,8 @@ def plot_simplified_level_scheme(groundStateData,levelData,num_clusters=3,max_le
         drawGroupBox(fig_clusters,xMin,xMax,minE,maxE,i)
 
     # Combine fig_data and fig_clusters to ensure proper overlay of data on cluster groups
-    # print(fig_data)
-    # print(fig_clusters['data']+fig_data['data'])
-    # fig_ = go.Figure(data=fig_clusters['data']+fig_data['data']+fig_data['data'])
-    fig_ = go.Figure()
-
-    # Add cluster scatter data first to put at bottom layer of the plot
-    for trace in fig_clusters['data']:
-        fig_.add_trace(trace)
-    # Add scatter plot data from fig_data next to layer over the clusters
-    for trace in fig_data['data']:
-        fig_.add_trace(trace)
-    # Add level line data from fig_data next to layer over the clusters and other scatter data
-    for shape in fig_data['layout']['shapes']:
-        fig_.add_shape(shape)
+    # (cluster boxes at the bottom layer, then separation energies, decay widths and levels)
+    fig_ = go.Figure(data=fig_clusters['data']+fig_data['data'])
 
     # Display legends, axis name changes
     fig_.update_legends()
@@ -306,3 +360,76 @@ def plot_simplified_level_scheme(groundStateData,levelData,num_clusters=3,max_le
     #     fig_.update_xaxes(range=[0, 2],showticklabels=False,showgrid=False)
     #     fig_.update_yaxes(range=[0, 2],showticklabels=False,showgrid=False)
     #     return fig_
+
+
+def plot_full_level_scheme(groundStateData,levelData,energyRange=None,columnRange=None,
+                           max_levels=FULL_SCHEME_MAX_LEVELS,energy_bins=FULL_SCHEME_ENERGY_BINS):
+    '''
+    Given the same pandas DataFrames as plot_simplified_level_scheme, plots every level of the nucleus in its
+    J^\pi column. Only the visible window is sent to the browser:
+     - energyRange: [min, max] visible energy in MeV (default: all levels and separation energies)
+     - columnRange: [min, max] visible x-axis (J^\pi column) positions (default: all columns)
+
+    When more than max_levels levels are visible, each column is binned into energy_bins energy bins and the
+    number of levels per bin is shown as a heatmap instead. Zooming in (see app.py) replots the smaller window,
+    down to the individual levels, so the figure size is bounded by max_levels and energy_bins.
+
+    Returns a figure of the levels (or level counts) in the window
+    '''
+    levels = levelData.dropna(subset=['energy'])
+    # If only nan energies, pass error to exception display case
+    if levels.empty:
+        raise ValueError
+    n, z = levels['n'].unique()[0], levels['z'].unique()[0]
+    energies = levels['energy'].to_numpy(dtype=np.float64) * 10**-3
+    # Columns in the same order as the simplified level scheme, the same for every window
+    columns, names = jp_columns(levels)
+    xMin, xMax = -0.5, len(names)-0.5
+
+    isotope = groundStateData[(groundStateData['n']==n)&(groundStateData['z']==z)]
+    sn = isotope['sn'].values[0] * 10**-3
+    sp = isotope['sp'].values[0] * 10**-3
+    if energyRange is None:
+        yMin, yMax = np.nanmin([energies.min(), sn, sp]), np.nanmax([energies.max(), sn, sp])
+        padding = (yMax - yMin)/10 or 1 # Extra energy range padding (1 MeV for a single level)
+        energyRange = [yMin-padding, yMax+padding]
+    eLow, eHigh = energyRange
+
+    visible = (energies >= eLow) & (energies <= eHigh)
+    if columnRange is not None:
+        visible &= (columns >= columnRange[0]) & (columns <= columnRange[1])
+    nVisible = int(visible.sum())
+
+    fig_ = go.Figure()
+    if nVisible > max_levels:
+        # Count the levels per (column, energy bin), empty bins are left transparent
+        counts, _, energyEdges = np.histogram2d(columns[visible], energies[visible],
+                                                bins=[np.arange(len(names)+1)-0.5, np.linspace(eLow, eHigh, energy_bins+1)])
+        counts = counts.T
+        counts[counts == 0] = np.nan
+        fig_.add_trace(go.Heatmap(
+            x=np.arange(len(names)),
+            y=(energyEdges[:-1] + energyEdges[1:])/2,
+            z=counts,
+            customdata=np.tile(np.array(names, dtype=str), (energy_bins, 1)),
+            hovertemplate='%{customdata}: %{z} levels near %{y:.3f} MeV<extra></extra>',
+            colorscale='Viridis',
+            colorbar=dict(title='Levels'),
+        ))
+        fig_.update_layout(title_text=f'{nVisible} levels, zoom in to see the individual levels')
+    plot_separation_energy(fig_,sn, xMin, xMax,'Neutron','blue')
+    plot_separation_energy(fig_,sp, xMin, xMax,'Proton','red')
+    if 0 < nVisible <= max_levels:
+        drawLevels(fig_,columns[visible],energies[visible],
+                   levels['half_life'].to_numpy()[visible],levels['unit_hl'].to_numpy()[visible])
+
+    fig_.update_layout(legend=dict(orientation='h',
+                                yanchor="bottom",y=1.0,
+                                xanchor="right",x=1),
+                       uirevision=f'{n}-{z}') # Keeps the user's zoom while windows of the same nucleus are replotted
+    fig_.update_xaxes(title_text='State',
+                    ticktext=list(names),
+                    tickvals=list(range(len(names))),
+                    range=columnRange or [xMin, xMax])
+    fig_.update_yaxes(title_text='Energy (MeV)',range=[eLow, eHigh])
+    return fig_
@@ -0,0 +1,142 @@
+'''
+This file contains the store of precomputed simplified level schemes (see build_level_schemes.py).
+
+For every nuclide it keeps the serialized level scheme figure in a SQLite file shared by all gunicorn
+workers. Each entry is stored along with a hash of the data
+it was built from (the nuclide's levels and separation energies), so an entry is only used while that data
+is unchanged and nuclides are rebuilt one by one when their levels change. The whole store is dropped when
+LEVEL_SCHEME_FORMAT (or the plotly version) changes, since the figures would look different.
+
+Level schemes missing from the store are built when first requested and added to it. Nuclides without
+levels to show have no level scheme (see has_levels), so they're never stored.
+
+Settings (environment variables):
+ - LEVEL_SCHEME_STORE_PATH: Location of the SQLite file (default: data/level_schemes.sqlite next to this file)
+'''
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import logging
+import pandas as pd
+import plotly
+
+import level_scheme_display_functions as lsdf
+import nuclear_chart_display_types as ncdt
+from spin_parity import SPIN_PARITY_COLUMNS, add_spin_parity
+
+logger = logging.getLogger(__name__)
+
+LEVEL_SCHEME_STORE_PATH = os.environ.get('LEVEL_SCHEME_STORE_PATH',
+                                         os.path.join(os.path.dirname(os.path.abspath(__file__)),'data','level_schemes.sqlite'))
+
+# Bump when the figures drawn by level_scheme_display_functions change. Stored figures carry the app's figure
+# template (see nuclear_chart_display_types.load_app_template), so it's part of the format too
+LEVEL_SCHEME_FORMAT = f'4-plotly{plotly.__version__}-template{ncdt.APP_TEMPLATE_HASH}'
+
+
+def known_jp_levels(levels):
+    '''Levels which are shown on the level scheme (those with a known J^pi), along with their parsed J^pi columns'''
+    return add_spin_parity(levels.dropna(subset=['jp']))
+
+def has_levels(levels):
+    '''Whether a nuclide has levels to show on its level scheme (levels as returned by known_jp_levels)'''
+    return not levels['energy'].isna().all()
+
+def level_scheme_key(isotope, levels, num_clusters=3):
+    '''Hash of the data a nuclide's level scheme is built from (the parsed J^pi columns follow from 'jp')'''
+    levels = levels.drop(columns=SPIN_PARITY_COLUMNS, errors='ignore')
+    digest = hashlib.sha1(pd.util.hash_pandas_object(levels, index=False).to_numpy().tobytes())
+    digest.update(repr((float(isotope['sn'].values[0]), float(isotope['sp'].values[0]), num_clusters)).encode())
+    return digest.hexdigest()
+
+def build_level_scheme(isotope, levels, num_clusters=3):
+    '''Returns the figure of a nuclide's simplified level scheme as JSON, drawn with the app's figure template'''
+    figure = lsdf.plot_simplified_level_scheme(isotope, levels, num_clusters)
+    # Stored figures are served as they are, so they never depend on the default template of the building process
+    figure.update_layout(template=ncdt.load_app_template())
+    return figure.to_json()
+
+
+class LevelSchemeStore:
+    '''
+    SQLite backed store of level scheme figures keyed by nuclide name (e.g. '12C').
+
+    Like the level cache, each process/thread opens its own connection and the database runs in WAL mode.
+    '''
+    def __init__(self, path=LEVEL_SCHEME_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        row = conn.execute("SELECT value FROM meta WHERE name='format'").fetchone()
+        if row is None or row[0] != LEVEL_SCHEME_FORMAT: # Figures (and tables) of another format are never used
+            conn.execute('DROP TABLE IF EXISTS schemes')
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('format', ?)", (LEVEL_SCHEME_FORMAT,))
+        conn.execute('''CREATE TABLE IF NOT EXISTS schemes (
+                            nuclide TEXT PRIMARY KEY,
+                            key TEXT NOT NULL,
+                            figure TEXT NOT NULL)''')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, nuclide, key):
+        '''Returns the figure (as a dict) of a nuclide if it was stored for key, None otherwise'''
+        row = self._connect().execute('SELECT figure FROM schemes WHERE nuclide=? AND key=?', (nuclide, key)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, nuclide, key, figureJson):
+        self._connect().execute('INSERT OR REPLACE INTO schemes (nuclide, key, figure) VALUES (?,?,?)',
+                                (nuclide, key, figureJson))
+
+    def put_many(self, entries):
+        '''Stores many (nuclide, key, figure JSON) entries in one transaction'''
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN')
+            conn.executemany('INSERT OR REPLACE INTO schemes (nuclide, key, figure) VALUES (?,?,?)', entries)
+
+    def keys(self):
+        '''Returns {nuclide: key} of all stored level schemes'''
+        return dict(self._connect().execute('SELECT nuclide, key FROM schemes'))
+
+    def remove(self, nuclides):
+        self._connect().executemany('DELETE FROM schemes WHERE nuclide=?', [(nuclide,) for nuclide in nuclides])
+
+    def get_or_build(self, nuclide, isotope, levels, num_clusters=3):
+        '''
+        Returns the simplified level scheme figure (as a dict) of a nuclide, from the store if it is up to date
+        with the levels and separation energies, otherwise it's built and stored.
+        Raises ValueError if the nuclide has no levels to show (see has_levels).
+        '''
+        key = level_scheme_key(isotope, levels, num_clusters)
+        try:
+            stored = self.get(nuclide, key)
+        except (sqlite3.Error, OSError, ValueError) as e: # A broken store should never take down the level scheme
+            logger.warning('Level scheme store unavailable (%s), building %s directly', e, nuclide)
+            stored = None
+        if stored is not None:
+            return stored
+        figureJson = build_level_scheme(isotope, levels, num_clusters)
+        try:
+            self.put(nuclide, key, figureJson)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('Could not store level scheme of %s: %s', nuclide, e)
+        return json.loads(figureJson)
+
+
+# Store shared by the callbacks of this worker
+level_scheme_store = LevelSchemeStore()
@@ -0,0 +1,201 @@
+'''
+This file contains the columnar, memory-mapped store for bulk nuclear data (mainly the IAEA level data
+of every nuclide).
+
+File layout:
+ - 8 byte magic string and the little endian uint64 length of a JSON header
+ - JSON header describing every table: its columns (numpy dtype and byte offset) and the byte offset of
+   its (Z, N) index
+ - Column data, each column stored contiguously and 64 byte aligned
+
+Rows of a table are sorted by (z, n) and the index is an offsets array over the dense (Z_max+1, N_max+1)
+grid, so the rows of one nuclide are the slice offsets[k]:offsets[k+1] with k = z*(N_max+1) + n. The file
+is opened with mmap, so looking up a nuclide reads only its rows and nothing is parsed.
+
+Settings (environment variables):
+ - LEVEL_STORE_PATH: Location of the store (default: data/level_store.bin next to this file)
+'''
+
+import os
+import json
+import mmap
+import hashlib
+import numpy as np
+import pandas as pd
+
+LEVEL_STORE_PATH = os.environ.get('LEVEL_STORE_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)),'data','level_store.bin'))
+
+MAGIC = b'NBBSTOR1'
+ALIGN = 64
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def _column_array(values):
+    '''Converts a DataFrame column to a fixed width numpy array (strings are stored as UTF-8, NaN as empty)'''
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64)
+    encoded = [b'' if pd.isna(v) else str(v).encode() for v in values]
+    width = max([len(v) for v in encoded] + [1])
+    return np.array(encoded, dtype=f'S{width}')
+
+def write_store(path, tables, meta=None):
+    '''
+    Writes a dictionary of {table name: DataFrame} to a store file. Every DataFrame must contain the
+    integer columns 'z' and 'n'. An optional JSON serializable meta dictionary is kept in the header.
+    The file is written next to its destination and moved in place so readers never see a partial file.
+    '''
+    header = {'tables': {}, 'meta': meta or {}}
+    arrays = []
+    offset = 0
+    for name, frame in tables.items():
+        frame = frame.sort_values(['z','n'], kind='stable').reset_index(drop=True)
+        z, n = frame['z'].to_numpy(dtype=np.int64), frame['n'].to_numpy(dtype=np.int64)
+        shape = (int(z.max())+1, int(n.max())+1) if len(frame) else (0, 0)
+        # offsets[k]:offsets[k+1] are the rows of nuclide k = z*shape[1] + n
+        counts = np.bincount(z*shape[1] + n, minlength=shape[0]*shape[1])
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        table = {'nrows': len(frame), 'shape': shape, 'columns': []}
+        table['index_offset'] = offset
+        arrays.append((offset, offsets))
+        offset = _aligned(offset + offsets.nbytes)
+        for column in frame.columns:
+            array = _column_array(frame[column])
+            table['columns'].append({'name': column, 'dtype': array.dtype.str, 'offset': offset})
+            arrays.append((offset, array))
+            offset = _aligned(offset + array.nbytes)
+        # Element symbol -> Z, used to find nuclides by name (e.g. '12C')
+        if 'symbol' in frame.columns:
+            symbols = frame.drop_duplicates('z')
+            table['symbols'] = {str(s): int(zz) for s, zz in zip(symbols['symbol'], symbols['z'])}
+        header['tables'][name] = table
+
+    # Checksum of the data section (the bytes following the header, including alignment padding)
+    checksum = hashlib.sha256()
+    position = 0
+    for arrayOffset, array in arrays:
+        checksum.update(bytes(arrayOffset - position))
+        data = np.ascontiguousarray(array).tobytes()
+        checksum.update(data)
+        position = arrayOffset + len(data)
+    checksum.update(bytes(offset - position))
+    header['sha256'] = checksum.hexdigest()
+
+    headerBytes = json.dumps(header).encode()
+    dataStart = _aligned(len(MAGIC) + 8 + len(headerBytes))
+    tempPath = path + '.tmp{}'.format(os.getpid())
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tempPath, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(headerBytes)).tobytes())
+        f.write(headerBytes)
+        for arrayOffset, array in arrays:
+            f.seek(dataStart + arrayOffset)
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(dataStart + offset)
+    os.replace(tempPath, path)
+
+def write_level_store(path, levelFrames, meta=None):
+    '''Writes the level DataFrames of many nuclides (e.g. one per IAEA levels request) as the 'levels' table'''
+    return write_store(path, {'levels': pd.concat(list(levelFrames), ignore_index=True)}, meta=meta)
+
+
+class StoreTable:
+    '''One table of a LevelStore, all columns are read-only numpy views into the mapped file'''
+    def __init__(self, buffer, dataStart, table):
+        self.nrows = table['nrows']
+        self.shape = tuple(table['shape'])
+        self.symbols = table.get('symbols', {})
+        size = self.shape[0]*self.shape[1]
+        self.offsets = np.frombuffer(buffer, dtype=np.int64, count=size+1, offset=dataStart+table['index_offset'])
+        self.columns = {}
+        for column in table['columns']:
+            self.columns[column['name']] = np.frombuffer(buffer, dtype=np.dtype(column['dtype']), count=self.nrows,
+                                                         offset=dataStart+column['offset'])
+
+    def has(self, z, n):
+        return 0 <= z < self.shape[0] and 0 <= n < self.shape[1] and self.count(z, n) > 0
+
+    def count(self, z, n):
+        k = z*self.shape[1] + n
+        return int(self.offsets[k+1] - self.offsets[k])
+
+    def rows(self, z, n):
+        '''Returns the slice of rows belonging to nuclide (z, n), empty if it isn't in the table'''
+        if not (0 <= z < self.shape[0] and 0 <= n < self.shape[1]):
+            return slice(0, 0)
+        k = z*self.shape[1] + n
+        return slice(int(self.offsets[k]), int(self.offsets[k+1]))
+
+    def frame(self, rows=slice(None)):
+        '''Builds a DataFrame of the given rows (all by default), empty strings are returned as NaN'''
+        data = {}
+        for name, array in self.columns.items():
+            values = array[rows]
+            if values.dtype.kind == 'S':
+                decoded = pd.Series(values).str.decode('utf-8')
+                data[name] = decoded.where(decoded != '', np.nan)
+            else:
+                data[name] = values
+        return pd.DataFrame(data)
+
+    def nuclide(self, z, n):
+        return self.frame(self.rows(z, n))
+
+
+class LevelStore:
+    '''Read-only, memory-mapped access to a store file written by write_store()'''
+    def __init__(self, path=LEVEL_STORE_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a nuclear data store')
+        headerLength = int(np.frombuffer(self._mmap, dtype=np.uint64, count=1, offset=len(MAGIC))[0])
+        headerStart = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[headerStart:headerStart+headerLength])
+        self.meta = self.header['meta']
+        self.dataStart = _aligned(headerStart + headerLength)
+        self.tables = {name: StoreTable(self._mmap, self.dataStart, table)
+                       for name, table in self.header['tables'].items()}
+
+    def verify(self):
+        '''Raises ValueError if the data section doesn't match the checksum written with the store'''
+        expected = self.header.get('sha256')
+        if expected is None:
+            return
+        if hashlib.sha256(self._mmap[self.dataStart:]).hexdigest() != expected:
+            raise ValueError(f'{self.path} is corrupted (checksum mismatch)')
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def levels(self, z, n):
+        '''Returns the levels of nuclide (z, n) as a DataFrame (empty if the nuclide has no level data)'''
+        return self.tables['levels'].nuclide(z, n)
+
+    def find(self, A, symbol):
+        '''Returns (z, n) of a nuclide given by its mass number and element symbol, None if the element is unknown'''
+        for table in self.tables.values():
+            z = table.symbols.get(symbol)
+            if z is not None:
+                return z, int(A) - z
+        return None
+
+
+def open_level_store(path=LEVEL_STORE_PATH, verify=True):
+    '''Opens (and by default verifies) the level store if one has been built, returns None otherwise'''
+    if not os.path.exists(path):
+        return None
+    store = LevelStore(path)
+    if verify:
+        store.verify()
+    return store
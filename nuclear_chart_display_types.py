@@ -1,12 +1,17 @@
 '''
 This file contains:
 
-Options for Nuclear Chart display:
+Options for Nuclear Chart display (each takes either a ground state DataFrame or a NuclideGrid view):
  - Half lives
+ - Decay Modes
  - Binding Energy per Nucleon
  - Year Discovered
 
+Heatmap values are kept as numpy arrays (float32, or uint8 codes for the decay mode chart) and sent to
+the browser as base64 typed arrays (see encode_typed_arrays).
+
 Also included are functions to plot:
+ - The complete nuclear chart figure (heatmap, magic numbers and toggled overlays)
  - Magic Numbers for the given dataset range
  - Scatter plot points for user-made nuclei
 
@@ -14,10 +19,59 @@ Written by:
  - Joshua Wylie
 '''
 
+import json
+import hashlib
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import os
+import plotly.io as pio
+from dash_bootstrap_templates import load_figure_template
+import base64
+
+from nuclide_grid import NuclideGrid, DECAY_MODES
+from picture_manifest import approved_pictures
+
+# Dash bootstrap theme of the app and the layout of its figure template, figures are drawn with white text on a dark background
+APP_THEME = 'cyborg'
+APP_TEMPLATE_LAYOUT = {
+    'xaxis': {
+        'titlefont': {
+            'color': 'white',  # Set to a color that's visible on the dark background
+            'size': 16,
+        },
+        'tickfont': {
+            'color': 'white',  # Set to a suitable color
+            'size': 12,
+        },
+    },
+    'yaxis': {
+        'titlefont': {
+            'color': 'white',  # Set to a color that's visible on the dark background
+            'size': 16,
+        },
+        'tickfont': {
+            'color': 'white',  # Set to a suitable color
+            'size': 12,
+        },
+    },
+    'legend': {
+        'font': {
+            'color': 'white'
+        }
+    },
+    'paper_bgcolor': '#292b2c',  # Set the background color to match CYBORG theme
+    'plot_bgcolor': '#292b2c',  # Set the background color to match CYBORG theme
+}
+
+# Changes whenever the app's figure template does (e.g. for keys of stored figures)
+APP_TEMPLATE_HASH = hashlib.sha1(json.dumps([APP_THEME, APP_TEMPLATE_LAYOUT], sort_keys=True).encode()).hexdigest()[:12]
+
+def load_app_template(theme_name=APP_THEME):
+    '''Loads the figure template of the app's dash bootstrap theme with the app's layout and makes it the default'''
+    load_figure_template(theme_name)
+    template = pio.templates[theme_name]
+    template.layout = APP_TEMPLATE_LAYOUT
+    return template
 
 def is_number(s):
     try:
@@ -44,6 +98,36 @@ def discrete_colorscale(bvals, colors):
     return dcolorscale    
 
 
+def typed_array(array_):
+    '''
+    Returns the plotly.js (>= 2.28) typed array form of a numpy array: its little endian bytes in base64
+    along with the dtype and shape. This is several times smaller and faster to parse than a JSON list.
+    '''
+    array_ = np.ascontiguousarray(array_, dtype=array_.dtype.newbyteorder('<'))
+    spec = {'dtype': array_.dtype.str[1:], 'bdata': base64.b64encode(array_).decode('ascii')}
+    if array_.ndim > 1:
+        spec['shape'] = ', '.join(str(s) for s in array_.shape)
+    return spec
+
+def encode_typed_arrays(figure_):
+    '''Replaces the numpy arrays (e.g. heatmap z values) of the traces of a figure dict by typed arrays'''
+    for trace in figure_.get('data', []):
+        for key, value in trace.items():
+            if isinstance(value, np.ndarray) and value.dtype.kind in 'fiu':
+                trace[key] = typed_array(value)
+    return figure_
+
+
+def as_grid(data_):
+    '''
+    Returns a NuclideGrid for a chart function input. DataFrames are placed on a grid spanning 0 to their
+    maximum proton/neutron number (so no nucleus is dropped), NuclideGrid views are used as they are.
+    '''
+    if isinstance(data_, NuclideGrid):
+        return data_
+    return NuclideGrid.from_dataframe(data_)
+
+
 def half_life_plot(data_):
     '''
     Given a pandas DataFrame with the assumed columns:
@@ -70,41 +154,14 @@ def half_life_plot(data_):
         [1.0, 'rgb(200, 200, 200)'],  # Grey
     ]
 
-    rows = data_['z'].unique()
-    cols = data_['n'].unique()
-
-    # Serves as the Heatmap grid spanning from minimum proton/neutron to maximum proton/neutron
-    constructedMap = np.ones((len(rows),len(cols))) * np.nan # By setting all to NaN, any element with no data will be Transparent and not plotted
-
-    # Populate Heatmap grid with information for stable nuclei first
-    stableNuclei = data_[data_['half_life']=='STABLE']
-    for i, row in stableNuclei.iterrows():
-        try:
-            constructedMap[row['z'],row['n']] = stableVal # Set to large log number to be effectively Stable
-        except:
-            continue
-    
-    # Populate Heatmap grid with information for nuclei with unknown half-lives
-    # notAvailableNuclei = data_[data_['half_life']==' '].copy() # Old version of IAEA data, was changed to NaN
-    notAvailableNuclei = data_[data_['half_life'].isna()]
-    for i, row in notAvailableNuclei.iterrows():
-        try:
-            constructedMap[row['z'],row['n']] = unknownVal # Set to large log number to be effectively unknown
-        except:
-            continue
-
-    # Populate Heatmap grid with information for all known unstable nuclei
-    # unstableNuclei = data_[(data_['half_life']!='STABLE')&(data_['half_life']!=' ')].copy() # Old version of IAEA data, was changed to NaN
-    unstableNuclei = data_[(data_['half_life']!='STABLE')&(data_['half_life'].notnull())]
-    for i, row in unstableNuclei.iterrows():
-        try:
-            constructedMap[row['z'],row['n']] = row['log(half_life_sec)']
-        except:
-            continue
+    grid = as_grid(data_)
+    constructedMap = grid.log_half_life.astype(float) # NaN where there's no nucleus, so it is Transparent and not plotted
+    constructedMap[grid.stable] = stableVal # Set to large log number to be effectively Stable
+    constructedMap[grid.unknown] = unknownVal # Set to large log number to be effectively unknown
     
     # Construct plotly heatmap
     chartMap = go.Heatmap(
-        z=constructedMap.tolist(),
+        z=constructedMap.astype(np.float32),
         colorscale=custom_half_life_colors,
         name='',
         xgap=0.5, # Provide slight gap between each heatmap box
@@ -136,8 +193,6 @@ def decay_mode_plot(data_):
      - log(half_life_sec): Log of a nucleus' half life in seconds
     '''
     colorbar_axis_offset = -0.3
-    rows = data_['z'].unique()
-    cols = data_['n'].unique()    
 
     # Define discrete colorscale
     # ['#FF0000'],  # Red 2P
@@ -153,32 +208,29 @@ def decay_mode_plot(data_):
     # ['#C0C0C0'],  # Silver nan
     decayColors = ['#FF0000', '#FF00FF', '#FFA500', '#E97451', '#40E0D0',
                    '#1E90FF', '#0000FF', '#000000', '#663399', '#7CFC00', '#C0C0C0']
-    bvals = [i for i in range(len(decayColors)+1)] # Boundary values not normalized
-    dcolorsc = discrete_colorscale(bvals, decayColors)
+    # Each decay mode code sits in the middle of its colour interval, cells without a (known) decay mode get
+    # the code 255 which is clamped to a last, transparent and vanishingly thin interval (so it isn't plotted)
+    noDecayCode = 255
+    bvals = [i-0.5 for i in range(len(decayColors)+1)] + [len(decayColors)-0.49] # Boundary values not normalized
+    dcolorsc = discrete_colorscale(bvals, decayColors + ['rgba(0,0,0,0)'])
 
     # Define decay mode location within colorscale
-    decays = ['2P', 'P', 'EC', 'B+', 'B-', 'N', '2N', 'Stable', 'A', 'SF', 'nan']
-    decayVals = [bvals[i]+(bvals[i+1]-bvals[i])/2 for i in range(len(bvals)-1)]
+    decays = DECAY_MODES
+    decayVals = list(range(len(decays)))
     decayDict = dict(zip(decays, decayVals))
 
-    # Serves as the Heatmap grid spanning from minimum proton/neutron to maximum proton/neutron
-    constructedMap = np.ones((len(rows),len(cols))) * np.nan # By setting all to NaN, any element with no data will be Transparent and not plotted
-
-    # Populate Heatmap grid with information for all nuclei
-    for i, row in data_.iterrows():
-        try:
-            constructedMap[row['z'],row['n']] = decayDict[str(row['common_decays'])]
-        except:
-            continue
+    # Decay mode code of each nucleus as uint8 (code -1 and empty cells are not plotted)
+    decayCodes = as_grid(data_).decay_code
+    constructedMap = np.where(decayCodes >= 0, decayCodes, noDecayCode).astype(np.uint8)
 
     tickvals = list(decayDict.values())
     ticktext = list(decayDict.keys())
 
     # Construct plotly heatmap
     chartMap = go.Heatmap(
-        z=constructedMap.tolist(),
-        zmin=0, # set minimum for good color scale
-        zmax=max(decayVals)+0.5, # set maximum for good color scale
+        z=constructedMap,
+        zmin=bvals[0], # set minimum for good color scale
+        zmax=bvals[-1], # set maximum for good color scale
         colorscale=dcolorsc,
         name='',
         xgap=0.5, # Provide slight gap between each heatmap box
@@ -224,34 +276,16 @@ def binding_energy_per_nucleon_plot(data_):
         [1.0, 'rgb(128, 0, 128)'],  # Purple at 1.0
     ]
 
-    rows = data_['z'].unique()
-    cols = data_['n'].unique()
-
-    # Serves as the Heatmap grid spanning from minimum proton/neutron to maximum proton/neutron
-    constructedMap = np.ones((len(rows),len(cols))) * np.nan # By setting all to NaN, any element with no data will be Transparent and not plotted
-    
-    # Get known binding energy per nucleon for each known value
-    # knownNuclei = data_[data_['binding']!=' '] # Old version of IAEA data, was changed to NaN
-    knownNuclei = data_[data_['binding'].notnull()]
-    for i, row in knownNuclei.iterrows():
-        try:
-            constructedMap[row['z'],row['n']] = float(row['binding'])
-        except:
-            continue
-    # Get nuclei with unknown binding energy per nucleon
-    # unknownNuclei = data_[data_['binding']==' '] # Old version of IAEA data, was changed to NaN
-    unknownNuclei = data_[data_['binding'].isna()]
-    for i, row in unknownNuclei.iterrows():
-        try:
-            constructedMap[row['z'],row['n']] = -10 # For unknown nuclei
-        except:
-            continue
+    grid = as_grid(data_)
+    constructedMap = grid.binding.astype(float) # NaN where there's no nucleus, so it is Transparent and not plotted
+    constructedMap[grid.present & np.isnan(constructedMap)] = -10 # For nuclei with unknown binding energy per nucleon
+    bindingRange = [np.nanmin(grid.binding), np.nanmax(grid.binding)]
     # Construct plotly heatmap
     # Set tick marks for years from minimum to maximum binding energy
-    axisVals = np.linspace(min(data_['binding'].dropna()),max(data_['binding'].dropna()),6)
+    axisVals = np.linspace(bindingRange[0],bindingRange[1],6)
     axisText = ['{:.0f} keV'.format(val) for val in axisVals]
     chartMap = go.Heatmap(
-        z=constructedMap.tolist(),
+        z=constructedMap.astype(np.float32),
         colorscale=custom_binding_energy_per_nucleon_colors,
         name='',
         xgap=0.5, # Provide slight gap between each heatmap box
@@ -292,29 +326,15 @@ def year_discovered_plot(data_):
         [0.75, 'rgb(0, 255, 0)'],  # Green microsecond
         [1.0, 'rgb(0, 0, 255)'],  # Blue attosecond
     ]
-    rows = data_['z'].unique()
-    cols = data_['n'].unique()
-
-    # Serves as the Heatmap grid spanning from minimum proton/neutron to maximum proton/neutron
-    constructedMap = np.ones((len(rows),len(cols))) * np.nan # By setting all to NaN, any element with no data will be Transparent and not plotted
-
-    # Remove discovery years with nan in them
-    data_ = data_.dropna(subset='discovery')
-
-    # Populate Heatmap grid with information for discovered nuclei
-    for i, row in data_.iterrows():
-        year = row['discovery']
-        try:
-            constructedMap[row['z'],row['n']] = int(year)
-        except:
-            continue
+    constructedMap = as_grid(data_).discovery.astype(float) # Nuclei without a discovery year stay NaN (not plotted)
+    yearRange = [np.nanmin(constructedMap), np.nanmax(constructedMap)]
     
     # Construct plotly heatmap
     # Set tick marks for years from minimum to maximum discovery year
-    axisVals = np.linspace(min(data_['discovery'].dropna()),max(data_['discovery'].dropna()),6)
+    axisVals = np.linspace(yearRange[0],yearRange[1],6)
     axisText = ['{:.0f}'.format(val) for val in axisVals]
     chartMap = go.Heatmap(
-        z=constructedMap.tolist(),
+        z=constructedMap.astype(np.float32),
         colorscale=custom_year_discovered_colors,
         name='',
         xgap=0.5, # Provide slight gap between each heatmap box
@@ -333,6 +353,82 @@ def year_discovered_plot(data_):
 
     return chartMap#, dataNames, dataDecay
 
+# Chart type names (as shown in the app) and the functions building their heatmaps
+chartTypes = {
+    'Half Life': half_life_plot,
+    'Decay Mode': decay_mode_plot,
+    'Binding Energy Per Nucleon': binding_energy_per_nucleon_plot,
+    'Year Discovered': year_discovered_plot,
+}
+
+# Bump when build_nuclear_chart (or the chart functions it uses) draws the charts differently
+CHART_FORMAT = 1
+
+def build_nuclear_chart(grid_,nuclideIndex,chart_type_name,toggle_options):
+    '''
+    Builds the full nuclear chart figure shown in the app given:
+     - grid_:           NuclideGrid (view) of the nuclei to show
+     - nuclideIndex:    NuclideIndex of the ground state data (used to place the user-made nuclei)
+     - chart_type_name: One of the keys of chartTypes (e.g. 'Decay Mode')
+     - toggle_options:  Chart toggles, 1 to show the N=Z line and 2 to show user-made nuclei
+    '''
+    nBounds, zBounds = grid_.n_bounds(), grid_.z_bounds()
+    # Additional axes offsets to show magic number tiles later
+    xoffset, yoffset = 2, 2.5
+    xrange = [nBounds[0]-xoffset, nBounds[1]+0.5]
+    yrange = [zBounds[0]-yoffset, zBounds[1]]
+    chart = go.Figure()
+    chart.add_traces([chartTypes[chart_type_name](grid_)])
+
+    # Draw magic numbers
+    drawMagicNumbers(chart,xrange,yrange,xoffset, yoffset)
+
+    # Set any chart labels, aspect ratio, etc.
+    magicNumbers = [2, 8, 20, 28, 50, 82, 126]
+    # store current values of magic numbers that fall within given range
+    xVals = [m for m in magicNumbers if (m >= min(xrange)) and (m <= max(xrange))]
+    yVals = [m for m in magicNumbers if (m >= min(yrange)) and (m <= max(yrange))]
+    chart.update_layout(yaxis_scaleanchor='x') # Fix aspect ratio
+    chart.update_xaxes(title_text='Number of Neutrons',showspikes=True,range=xrange,showgrid=False,side='top',tickvals=xVals)
+    chart.update_yaxes(title_text='Number of Protons',showspikes=True,range=yrange,automargin=True,showgrid=False,tickvals=yVals)
+    
+    # Suppress Plotly default hover info and replace later with 'display_hover' function
+    chart.update_traces(hoverinfo='none',hovertemplate=None)
+    
+    ##### Toggle Options #####
+    # Overlays are always drawn at fixed trace indices and only their visibility follows the toggles,
+    # so switching them on and off in the app is a small partial update of the figure
+    # Find which is larger to set our line boundaries
+    points = list(nBounds)
+    if (points[0] >= zBounds[0]) and (points[1] > zBounds[1]):
+        points = list(zBounds)
+    chart.add_trace(go.Scatter(
+        x=points,
+        y=points,
+        mode="lines",
+        name='N=Z Line',
+        hoverinfo='skip',
+        line=dict(color='#5eb588',width=5),
+        showlegend=False
+    ))
+    show_user_made_nuclei(chart,nuclideIndex)
+    set_overlay_visibility(chart.data,toggle_options)
+    return chart
+
+# Trace index of each chart toggle option's overlay (the heatmap is trace 0)
+overlayTraces = {
+    1: 1, # N=Z line
+    2: 2, # User-made nuclei
+}
+
+def set_overlay_visibility(traces_,toggle_options):
+    '''
+    Shows the overlays of the selected toggle options and hides the others. traces_ can be the data of a
+    go.Figure or a dash Patch of the figure data.
+    '''
+    for option, index in overlayTraces.items():
+        traces_[index]['visible'] = option in toggle_options
+
 def drawMagicNumbers(fig_,xRange,yRange,xoffset,yoffset):
     # Draw magic number boxes and images of tiles
     magicNumbers = [2, 8, 20, 28, 50, 82, 126]
@@ -389,31 +485,14 @@ def separateSymAndA(string_):
             sym += i
     return [int(A), sym]
 
-def show_user_made_nuclei(fig_,chartData):
-    # List all found image files in 'assets/Approved_Pictures'
-    picturePath = 'assets/Approved_Pictures'
-    listPictures = [f for f in os.listdir(picturePath) if os.path.isfile(os.path.join(picturePath,f))]
-    # Split before the excitation number by keeping the first list element of a split('_') string
-    listNuclei = [ln.split('_')[0] for ln in listPictures]
-    listASym = [separateSymAndA(s) for s in listNuclei]
-    uniqueASym = pd.DataFrame(listASym,columns=['A','symbol'])
-    noDuplicatesASym = uniqueASym.drop_duplicates(keep='first').copy()
-
-    # create a dictionary of column names and the value you want
-    d = dict.fromkeys(['z','n'], 0)
-    noDuplicatesASym.assign(**d)
-
-    zlist = []
-
-    # Get z for uniqueASym which removed duplicate entries from ground state data
-    for i, row in noDuplicatesASym.iterrows():
-        zs = chartData.loc[chartData['symbol']==row['symbol'],'z'].to_numpy()
-        if len(zs)==0:
-            continue
-        
-        zlist.append(zs[0])
-    noDuplicatesASym.loc[:,'z'] = np.array(zlist)
-    noDuplicatesASym.loc[:,'n'] = noDuplicatesASym['A'].to_numpy() - noDuplicatesASym['z'].to_numpy()
+def show_user_made_nuclei(fig_,nuclideIndex):
+    # Nuclei (A, symbol) with at least one picture in 'assets/Approved_Pictures'
+    noDuplicatesASym = pd.DataFrame(sorted(approved_pictures.nuclei()),columns=['A','symbol'])
+
+    # Get z of each nucleus from its element symbol (nuclei of elements not in the ground state data are skipped)
+    noDuplicatesASym['z'] = noDuplicatesASym['symbol'].map(nuclideIndex.z_of)
+    noDuplicatesASym = noDuplicatesASym.dropna(subset=['z']).astype({'z': int})
+    noDuplicatesASym['n'] = noDuplicatesASym['A'] - noDuplicatesASym['z']
     
     fig_.add_trace(go.Scatter(
         x=noDuplicatesASym['n']+0.25, # Offset to place markers in the corner of the heatmap tiles
@@ -429,10 +508,4 @@ def show_user_made_nuclei(fig_,chartData):
 
 def check_if_user_made(A,symbol):
     # Checks if provided nucleus was made by a user, returns True if made
-    # List all found image files in 'assets/Approved_Pictures'
-    picturePath = 'assets/Approved_Pictures'
-    listPictures = [f for f in os.listdir(picturePath) if os.path.isfile(os.path.join(picturePath,f))]
-    # Split before the excitation number by keeping the first list element of a split('_') string
-    listNuclei = [ln.split('_')[0] for ln in listPictures]
-
-    return str(A)+symbol in listNuclei
+    return approved_pictures.has_nucleus(A,symbol)
@@ -0,0 +1,136 @@
+'''
+This file contains the NuclideGrid, which holds every quantity shown on the nuclear chart as a dense
+(Z_max+1, N_max+1) numpy array indexed as [z, n]. Cells without a nuclide are NaN (or -1 for the decay
+mode code), so any chart over a proton/neutron range is just a slice of these arrays.
+
+The grid of the full dataset is built once when the ground state data is loaded (see
+iaea_data.get_nuclide_grid()) and views of it are used when drawing the chart.
+
+Also included is the NuclideIndex, which finds the ground state row of a nuclide in O(1) given (Z, N),
+its name (e.g. '12C') or its element symbol (see iaea_data.get_nuclide_index()).
+'''
+
+import numpy as np
+
+# Decay modes in the order of the decay mode chart's discrete colorscale
+DECAY_MODES = ['2P', 'P', 'EC', 'B+', 'B-', 'N', '2N', 'Stable', 'A', 'SF', 'nan']
+
+
+class NuclideGrid:
+    '''
+    Dense arrays of the ground state data, all indexed as [z, n]:
+     - present:        True where a nuclide exists in the data
+     - stable:         True for stable nuclei ('STABLE' half life)
+     - unknown:        True for nuclei without a known half life
+     - log_half_life:  log10 of the half life in seconds
+     - decay_code:     Index of the nucleus' common decay mode in DECAY_MODES (-1 if not one of them)
+     - binding:        Binding energy per nucleon (keV)
+     - discovery:      Year discovered
+     - sn, sp:         Neutron and proton separation energies (keV)
+     - massexcess:     Mass excess (keV)
+    '''
+    quantities = ['log_half_life', 'binding', 'discovery', 'sn', 'sp', 'massexcess']
+    masks = ['present', 'stable', 'unknown']
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @property
+    def shape(self):
+        return self.present.shape
+
+    @classmethod
+    def from_dataframe(cls, data_, shape=None):
+        '''
+        Builds the grid from a ground state DataFrame with the columns z, n, half_life, log(half_life_sec),
+        common_decays, binding, discovery, sn, sp and massexcess. By default the grid spans 0..max Z and 0..max N.
+        '''
+        z = data_['z'].to_numpy(dtype=np.intp)
+        n = data_['n'].to_numpy(dtype=np.intp)
+        if shape is None:
+            shape = (int(z.max())+1, int(n.max())+1) if len(z) else (0, 0)
+
+        def toGrid(values, fill, dtype):
+            grid = np.full(shape, fill, dtype=dtype)
+            grid[z, n] = values
+            return grid
+
+        halfLife = data_['half_life']
+        decayCodes = {mode: code for code, mode in enumerate(DECAY_MODES)}
+        commonDecays = data_['common_decays'].astype(object).astype(str)
+        arrays = {
+            'present': toGrid(True, False, bool),
+            'stable': toGrid((halfLife == 'STABLE').to_numpy(), False, bool),
+            'unknown': toGrid(halfLife.isna().to_numpy(), False, bool),
+            'log_half_life': toGrid(data_['log(half_life_sec)'].to_numpy(dtype=np.float32), np.nan, np.float32),
+            'decay_code': toGrid(commonDecays.map(decayCodes).fillna(-1).to_numpy(dtype=np.int8), -1, np.int8),
+        }
+        for name in ['binding', 'discovery', 'sn', 'sp', 'massexcess']:
+            arrays[name] = toGrid(data_[name].to_numpy(dtype=np.float32), np.nan, np.float32)
+        return cls(arrays)
+
+    def view(self, n_max, z_max):
+        '''Returns a grid of the nuclei with n <= n_max and z <= z_max, sharing memory with this one'''
+        return NuclideGrid({name: array[:z_max+1, :n_max+1] for name, array in self.arrays.items()})
+
+    def has(self, z, n):
+        '''True if nuclide (z, n) is in the grid'''
+        z, n = int(z), int(n)
+        return 0 <= z < self.shape[0] and 0 <= n < self.shape[1] and bool(self.present[z, n])
+
+    def n_bounds(self):
+        '''(min, max) neutron number of the nuclei in the grid'''
+        ns = np.flatnonzero(self.present.any(axis=0))
+        return int(ns[0]), int(ns[-1])
+
+    def z_bounds(self):
+        '''(min, max) proton number of the nuclei in the grid'''
+        zs = np.flatnonzero(self.present.any(axis=1))
+        return int(zs[0]), int(zs[-1])
+
+
+class NuclideIndex:
+    '''
+    Lookup tables of the ground state data, built once with the dataset:
+     - rows:       Dense int32 array indexed as [z, n] of the (positional) row of each nuclide, -1 if not present
+     - symbol_z:   Element symbol -> Z
+     - nuclides:   Nuclide name (A + symbol, e.g. '12C') -> (Z, N)
+    '''
+    def __init__(self, rows, symbol_z, nuclides):
+        self.rows = rows
+        self.symbol_z = symbol_z
+        self.nuclides = nuclides
+
+    @classmethod
+    def from_dataframe(cls, data_):
+        '''Builds the index from a ground state DataFrame with the columns z, n and symbol'''
+        z = data_['z'].to_numpy(dtype=np.intp)
+        n = data_['n'].to_numpy(dtype=np.intp)
+        shape = (int(z.max())+1, int(n.max())+1) if len(z) else (0, 0)
+        rows = np.full(shape, -1, dtype=np.int32)
+        rows[z, n] = np.arange(len(z), dtype=np.int32)
+        symbols = data_['symbol'].astype(str).tolist()
+        symbol_z = {}
+        nuclides = {}
+        for zz, nn, symbol in zip(z.tolist(), n.tolist(), symbols):
+            symbol_z.setdefault(symbol, zz)
+            nuclides[f'{zz+nn}{symbol}'] = (zz, nn)
+        return cls(rows, symbol_z, nuclides)
+
+    def row(self, z, n):
+        '''Row of nuclide (z, n) in the ground state data, None if it isn't in the data'''
+        z, n = int(z), int(n)
+        if not (0 <= z < self.rows.shape[0] and 0 <= n < self.rows.shape[1]):
+            return None
+        row = int(self.rows[z, n])
+        return None if row < 0 else row
+
+    def find(self, A, symbol):
+        '''(z, n) of a nuclide given its mass number and element symbol, None if it isn't in the data'''
+        return self.nuclides.get(f'{int(A)}{symbol}')
+
+    def z_of(self, symbol):
+        '''Proton number of an element symbol, None if the element isn't in the data'''
+        return self.symbol_z.get(symbol)
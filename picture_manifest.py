@@ -0,0 +1,118 @@
+'''
+This file contains the manifest of the pictures of user built nuclei in assets/Approved_Pictures.
+
+Picture files are named {A}{symbol}_{excitation}-{name1};{name2}.{ext} (e.g. 4He_0-Joshua_Wylie.jpeg), and
+each name is parsed once into a Picture indexed by (A, symbol, excitation). The directory is only listed
+again when its modification time changes (a picture was added, removed or renamed), and its modification
+time is checked at most every PICTURE_MANIFEST_CHECK_SECONDS, so lookups normally touch no files at all.
+
+Settings (environment variables):
+ - PICTURE_MANIFEST_CHECK_SECONDS: Minimum seconds between checks of the directory for changes (default: 5)
+'''
+
+import os
+import re
+import time
+import hashlib
+import threading
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+PICTURE_PATH = 'assets/Approved_Pictures'
+PICTURE_MANIFEST_CHECK_SECONDS = float(os.environ.get('PICTURE_MANIFEST_CHECK_SECONDS', 5))
+
+# {A}{symbol}_{excitation}-{names}.{ext}, names are separated by ';' and use '_' for spaces
+PICTURE_NAME = re.compile(r'^(\d+)([A-Za-z]+)_(\d+)-(.+)\.([^.]+)$')
+
+Picture = namedtuple('Picture', ['A', 'symbol', 'excitation', 'names', 'file', 'path'])
+
+
+def parse_picture_name(fileName, directory=PICTURE_PATH):
+    '''Returns the Picture described by a file name, None if it doesn't follow the naming convention'''
+    match = PICTURE_NAME.match(fileName)
+    if match is None:
+        return None
+    A, symbol, excitation, names, _ = match.groups()
+    names = [name.replace('_',' ') for name in names.split(';')]
+    return Picture(int(A), symbol, int(excitation), names, fileName, os.path.join(directory, fileName))
+
+
+class PictureManifest:
+    '''Index of the pictures of a directory by (A, symbol, excitation), kept up to date with the directory'''
+    def __init__(self, path=PICTURE_PATH, check_seconds=PICTURE_MANIFEST_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.version = None # Modification time (ns) of the directory when it was last listed
+        self._pictures = {}
+        self._nuclei = frozenset()
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_seconds:
+            return
+        with self._lock:
+            if now - self._checked < self.check_seconds:
+                return
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = 0
+            if mtime != self.version:
+                self._scan(mtime)
+            self._checked = now
+
+    def _scan(self, mtime):
+        pictures = {}
+        if mtime:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    picture = parse_picture_name(entry.name, self.path)
+                    if picture is None:
+                        logger.warning('Ignoring picture %s which is not named {A}{symbol}_{excitation}-{names}.{ext}', entry.name)
+                        continue
+                    # Several files of one state are listed in name order, the first one is used
+                    key = (picture.A, picture.symbol, picture.excitation)
+                    if key not in pictures or picture.file < pictures[key].file:
+                        pictures[key] = picture
+        self._pictures = pictures
+        self._nuclei = frozenset((A, symbol) for A, symbol, _ in pictures)
+        self.version = mtime
+
+    def get(self, A, symbol, excitation=0):
+        '''Picture of a state of a nucleus, None if no one has built it yet'''
+        self._refresh()
+        return self._pictures.get((int(A), symbol, int(excitation)))
+
+    def nuclei(self):
+        '''Set of (A, symbol) of all nuclei with at least one picture'''
+        self._refresh()
+        return self._nuclei
+
+    def has_nucleus(self, A, symbol):
+        '''True if at least one state of the nucleus has been built'''
+        return (int(A), symbol) in self.nuclei()
+
+    def content_hash(self):
+        '''
+        Hash of the pictures in the manifest (who built which state), unlike current_version it doesn't change
+        when the directory is only touched or checked out again
+        '''
+        self._refresh()
+        pictures = sorted((A, symbol, excitation, picture.names, picture.file)
+                          for (A, symbol, excitation), picture in self._pictures.items())
+        return hashlib.sha1(repr(pictures).encode()).hexdigest()[:12]
+
+    def current_version(self):
+        '''Version of the manifest after checking the directory for changes (e.g. for cache keys)'''
+        self._refresh()
+        return self.version
+
+
+# Manifest of the approved pictures shared by the nuclear chart and the level scheme
+approved_pictures = PictureManifest()
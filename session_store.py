@@ -0,0 +1,197 @@
+'''
+This file contains the server-side store for DataFrames used by the app's callbacks.
+
+Instead of sending whole DataFrames to the browser as JSON (and parsing them again in every callback),
+the dcc.Store components only hold small keys (dataset version, slider bounds, selected nuclide) and the
+DataFrames stay on the server in a store with a pluggable backend:
+ - memory:     Per worker, least recently used entries are evicted (default)
+ - filesystem: Pickle files in a directory shared by all workers on one machine
+ - redis:      A Redis server shared by all workers and machines (needs the optional 'redis' package)
+
+All entries expire after a TTL. A missing or expired entry is never an error: callers pass a function
+computing the value again (see SessionStore.get_or_compute).
+
+Settings (environment variables):
+ - SESSION_STORE_BACKEND:    memory, filesystem or redis (default: memory)
+ - SESSION_STORE_PATH:       Directory of the filesystem backend (default: cache/session_store next to this file)
+ - SESSION_STORE_REDIS_URL:  URL of the Redis server (default: redis://localhost:6379/0)
+ - SESSION_STORE_TTL:        Seconds after which an entry expires (default: 3600)
+ - SESSION_STORE_MAX_ITEMS:  Maximum number of entries of the memory backend (default: 256)
+'''
+
+import os
+import time
+import pickle
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_BACKEND = os.environ.get('SESSION_STORE_BACKEND', 'memory')
+SESSION_STORE_PATH = os.environ.get('SESSION_STORE_PATH',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)),'cache','session_store'))
+SESSION_STORE_REDIS_URL = os.environ.get('SESSION_STORE_REDIS_URL', 'redis://localhost:6379/0')
+SESSION_STORE_TTL = float(os.environ.get('SESSION_STORE_TTL', 3600))
+SESSION_STORE_MAX_ITEMS = int(os.environ.get('SESSION_STORE_MAX_ITEMS', 256))
+
+
+class MemoryBackend:
+    '''Bounded in-process store, entries are evicted least recently used first'''
+    def __init__(self, ttl=SESSION_STORE_TTL, max_items=SESSION_STORE_MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items = OrderedDict() # key -> (expiry time, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class FileSystemBackend:
+    '''Stores pickled values as files in a directory, expired files are treated as missing and removed'''
+    def __init__(self, path=SESSION_STORE_PATH, ttl=SESSION_STORE_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest() + '.pkl')
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._file(key)
+        tempPath = path + '.tmp{}'.format(os.getpid())
+        with open(tempPath, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tempPath, path) # Other workers never read a partially written file
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+
+class RedisBackend:
+    '''
+    Stores pickled values in Redis with an expiry. Any client with the get/set(ex=)/delete methods of
+    redis.Redis can be passed (e.g. FakeRedis), otherwise one is created from the URL.
+    '''
+    def __init__(self, url=SESSION_STORE_REDIS_URL, ttl=SESSION_STORE_TTL, client=None, prefix='nbb:session:'):
+        if client is None:
+            import redis # Optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        return None if data is None else pickle.loads(data)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=max(int(self.ttl), 1))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class FakeRedis:
+    '''Minimal in-process stand-in for redis.Redis (get, set with ex, delete) to run the redis backend locally'''
+    def __init__(self):
+        self._backend = MemoryBackend(ttl=float('inf'), max_items=float('inf'))
+        self._expiry = {}
+
+    def get(self, name):
+        if self._expiry.get(name, float('inf')) < time.monotonic():
+            self.delete(name)
+        return self._backend.get(name)
+
+    def set(self, name, value, ex=None):
+        self._backend.set(name, value)
+        if ex is not None:
+            self._expiry[name] = time.monotonic() + ex
+        return True
+
+    def delete(self, name):
+        self._backend.delete(name)
+        self._expiry.pop(name, None)
+
+
+backends = {
+    'memory': MemoryBackend,
+    'filesystem': FileSystemBackend,
+    'redis': RedisBackend,
+}
+
+
+class SessionStore:
+    '''Server-side store of DataFrames (or any picklable value) referenced from the browser by small keys'''
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_or_compute(self, key, compute):
+        '''
+        Returns the value stored under key, calling compute() and storing its result when the entry is
+        missing or expired. Errors of the backend are logged and the value is computed instead.
+        '''
+        try:
+            value = self.backend.get(key)
+        except Exception as e: # An unavailable store should only cost a recomputation
+            logger.warning('Session store unavailable (%s), computing %s directly', e, key)
+            return compute()
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning('Could not store %s in the session store: %s', key, e)
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning('Session store unavailable (%s)', e)
+            return None
+
+
+def open_session_store(backend=SESSION_STORE_BACKEND):
+    '''Creates the session store with the backend named by SESSION_STORE_BACKEND'''
+    if backend not in backends:
+        raise ValueError(f'Unknown session store backend {backend!r}, use one of {", ".join(backends)}')
+    return SessionStore(backends[backend]())
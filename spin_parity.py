@@ -0,0 +1,112 @@
+'''
+This file contains the parser turning the IAEA J^pi strings of levels (e.g. '3/2-', '(5/2)+', '1/2(+)',
+'(1/2+,3/2+)') into structured columns, so filtering and sorting levels by spin and parity are array operations:
+ - two_j:            2J as an integer (J is a multiple of 1/2, so J = two_j/2 exactly), -1 if unknown
+ - j:                J as a float, NaN if unknown
+ - parity:           +1 or -1, 0 if unknown
+ - j_tentative:      True if J is given in parentheses (e.g. '(5/2)+')
+ - parity_tentative: True if the parity is given in parentheses (e.g. '1/2(+)')
+ - tentative:        True if either one is tentative
+ - jp_options:       All assignments of the level as a tuple (e.g. ('1/2+', '3/2+') for '(1/2+,3/2+)')
+ - multiple:         True if the level has more than one assignment
+J, parity and the flags describe the first assignment.
+
+Every distinct string is only parsed once per process (there are a few thousand in the whole IAEA level data),
+a column is parsed by mapping its distinct values.
+'''
+
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+SPIN_PARITY_COLUMNS = ['two_j', 'j', 'parity', 'j_tentative', 'parity_tentative', 'tentative', 'jp_options', 'multiple']
+
+ASSIGNMENT = re.compile(r'^(\d+)(?:/(2))?([+-])?$')
+# A parity after a bracketed list of assignments applies to all of them, e.g. '(1/2,3/2)+' or '(1/2,3/2)(+)'
+GROUP_PARITY = re.compile(r'^(.*,.*[)\]])(\(?[+-]\)?)$')
+UNKNOWN = (-1, 0, False, False, ())
+
+
+@lru_cache(maxsize=None)
+def parse_jp(jp):
+    '''
+    Parses one J^pi string, returns (two_j, parity, j_tentative, parity_tentative, options).
+    Strings which aren't a J^pi assignment (e.g. empty, NaN or ranges) give (-1, 0, False, False, ()).
+    An assignment without a sign of its own has an unknown parity, unless the parity is given for the whole list.
+    '''
+    if not isinstance(jp, str):
+        return UNKNOWN
+    jp = jp.replace(' ', '')
+    sharedSign, sharedTentative = None, False
+    groupParity = GROUP_PARITY.match(jp)
+    if groupParity:
+        jp, groupSign = groupParity.groups()
+        sharedSign, sharedTentative = groupSign.strip('()'), groupSign.startswith('(')
+
+    jTentative = parityTentative = False
+    depth = 0
+    plain = []
+    for char in jp:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth = max(depth-1, 0)
+        else:
+            if depth: # Anything in brackets is tentative
+                jTentative |= char.isdigit()
+                parityTentative |= char in '+-'
+            plain.append(char)
+
+    assignments = [ASSIGNMENT.match(option) for option in ''.join(plain).split(',')]
+    if not assignments or not all(assignments):
+        return UNKNOWN
+    options = []
+    for match in assignments:
+        j = match.group(1) + ('/2' if match.group(2) else '')
+        options.append(j + (match.group(3) or sharedSign or ''))
+
+    first = assignments[0]
+    twoJ = int(first.group(1)) * (1 if first.group(2) else 2)
+    sign = first.group(3) or sharedSign
+    if not first.group(3):
+        parityTentative = sharedTentative
+    parity = {'+': 1, '-': -1, None: 0}[sign]
+    return twoJ, parity, jTentative, parityTentative and parity != 0, tuple(options)
+
+def spin_parity_columns(jpValues):
+    '''Structured columns (see SPIN_PARITY_COLUMNS) of an array or Series of J^pi strings, as a dict of numpy arrays'''
+    codes, uniques = pd.factorize(pd.Series(jpValues, dtype=object).map(lambda v: v.decode() if isinstance(v, bytes) else v))
+    parsed = [parse_jp(jp) for jp in uniques] + [UNKNOWN] # NaN values have code -1, the last entry
+    twoJ, parity, jTentative, parityTentative, options = zip(*parsed)
+    optionArray = np.empty(len(options), dtype=object) # Filled one by one so numpy keeps the tuples as objects
+    for i, option in enumerate(options):
+        optionArray[i] = option
+    columns = {
+        'two_j': np.array(twoJ, dtype=np.int16)[codes],
+        'parity': np.array(parity, dtype=np.int8)[codes],
+        'j_tentative': np.array(jTentative, dtype=bool)[codes],
+        'parity_tentative': np.array(parityTentative, dtype=bool)[codes],
+        'jp_options': optionArray[codes],
+        'multiple': np.array([len(option) > 1 for option in options], dtype=bool)[codes],
+    }
+    columns['j'] = np.where(columns['two_j'] >= 0, columns['two_j']/2, np.nan)
+    columns['tentative'] = columns['j_tentative'] | columns['parity_tentative']
+    return {name: columns[name] for name in SPIN_PARITY_COLUMNS}
+
+def add_spin_parity(levels):
+    '''Returns a copy of a levels DataFrame with the structured J^pi columns of its 'jp' column'''
+    return levels.assign(**spin_parity_columns(levels['jp']))
+
+def spin_parity_counts(twoJ, parity):
+    '''
+    Number of levels per J (rows) and parity (columns '+', '-' and '?' for unknown) given arrays of two_j and
+    parity, e.g. of the whole chart's levels (see iaea_data.level_spin_parity()). Levels without J are left out.
+    '''
+    twoJ, parity = np.asarray(twoJ), np.asarray(parity)
+    known = twoJ >= 0
+    width = int(twoJ[known].max())+1 if known.any() else 0
+    # Parity -1, 0 and +1 are stored as bins 0, 1 and 2 of each 2J
+    counts = np.bincount(twoJ[known].astype(np.intp)*3 + parity[known].astype(np.intp) + 1, minlength=width*3).reshape(width, 3)
+    table = pd.DataFrame(counts[:, [2, 0, 1]], columns=['+', '-', '?'], index=pd.Index(np.arange(width)/2, name='J'))
+    return table[table.sum(axis=1) > 0]
@@ -0,0 +1,140 @@
+'''
+Crawls a local stand-in for the IAEA livechart (serving csv files in the livechart format) with
+build_data_bundle.py and checks the bundle it writes.
+'''
+
+import os
+import sys
+import subprocess
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import pytest
+
+import iaea_data as iaea
+from benchmark_ground_state import raw_ground_state
+from build_data_bundle import build_bundle
+from level_store import open_level_store
+
+# Nuclides of the stand-in livechart: 4He has no levels (empty reply), 12C replies with headers only
+NUCLIDES = [(2, 2, 'He'), (6, 6, 'C'), (8, 8, 'O'), (8, 9, 'O')]
+LEVEL_COLUMNS = ['z', 'n', 'symbol', 'energy', 'jp', 'half_life', 'unit_hl']
+
+
+def ground_state_csv():
+    raw = raw_ground_state()
+    rows = pd.concat([raw[(raw['z'] == z) & (raw['n'] == n)] for z, n, _ in NUCLIDES])
+    return rows.to_csv(index=False)
+
+def levels_csv(z, n, symbol):
+    if (z, n) == (2, 2):
+        return ''
+    if (z, n) == (6, 6):
+        return ','.join(LEVEL_COLUMNS) + '\n'
+    levels = pd.DataFrame({'z': z, 'n': n, 'symbol': symbol, 'energy': [0.0, 1500.5, 3000.25],
+                           'jp': ['0+', '2+', '(3/2-)'], 'half_life': ['STABLE', '', ''], 'unit_hl': ['', '', '']})
+    return levels.to_csv(index=False)
+
+
+class Livechart:
+    '''Serves the stand-in livechart on a local port, replies can be made to fail a number of times'''
+    def __init__(self):
+        self.requests = collections.Counter()
+        self.failures = {} # (field, nuclide): [remaining failures, status]
+        files = {('ground_states', 'all'): ground_state_csv()}
+        files.update({('levels', f'{z+n}{symbol}'): levels_csv(z, n, symbol) for z, n, symbol in NUCLIDES})
+        livechart = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                key = (query['fields'][0], query['nuclides'][0])
+                livechart.requests[key] += 1
+                failure = livechart.failures.get(key)
+                if failure and failure[0] > 0:
+                    failure[0] -= 1
+                    self.send_error(failure[1])
+                    return
+                body = files[key].encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/relnsd/v0/data?'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def fail(self, field, nuclide, times, status=500):
+        self.failures[(field, nuclide)] = [times, status]
+
+
+@pytest.fixture
+def livechart():
+    server = Livechart()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+def build(livechart, tmp_path):
+    return build_bundle(url=livechart.url, output=str(tmp_path / 'bundle.bin'), checkpointDir=str(tmp_path / 'checkpoint'),
+                        workers=2, rate=0)
+
+
+def test_bundle_is_written(livechart, tmp_path):
+    assert build(livechart, tmp_path) == []
+    store = open_level_store(str(tmp_path / 'bundle.bin'))
+    assert store.meta['complete_levels']
+    assert sorted(zip(store['ground_states'].columns['z'], store['ground_states'].columns['n'])) == \
+        sorted((z, n) for z, n, _ in NUCLIDES)
+    levels = store.levels(8, 8)
+    assert levels['energy'].tolist() == [0.0, 1500.5, 3000.25]
+    assert levels['jp'].tolist() == ['0+', '2+', '(3/2-)']
+
+def test_command_line(livechart, tmp_path):
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'build_data_bundle.py')
+    subprocess.run([sys.executable, script, '--url', livechart.url, '--output', str(tmp_path / 'bundle.bin'),
+                    '--rate', '0', '--version', 'test'], check=True, cwd=tmp_path)
+    assert open_level_store(str(tmp_path / 'bundle.bin')).meta['version'] == 'test'
+
+def test_nuclides_without_levels_are_not_asked_again(livechart, tmp_path):
+    assert build(livechart, tmp_path) == []
+    assert build(livechart, tmp_path) == []
+    # Empty replies are checkpointed like any other, so they're only requested once
+    assert livechart.requests[('levels', '4He')] == 1
+    assert livechart.requests[('levels', '12C')] == 1
+    store = open_level_store(str(tmp_path / 'bundle.bin'))
+    assert store.levels(2, 2).empty and store.levels(6, 6).empty
+
+def test_transient_errors_are_retried(livechart, tmp_path, monkeypatch):
+    monkeypatch.setattr(iaea, 'IAEA_RETRIES', 2)
+    monkeypatch.setattr(iaea, '_session', None) # Sessions are made with the current settings
+    livechart.fail('levels', '16O', times=1, status=503)
+    livechart.fail('levels', '17O', times=2, status=502)
+    assert build(livechart, tmp_path) == []
+    assert livechart.requests[('levels', '16O')] == 2
+    assert livechart.requests[('levels', '17O')] == 3
+    assert open_level_store(str(tmp_path / 'bundle.bin')).levels(8, 9)['energy'].tolist() == [0.0, 1500.5, 3000.25]
+
+def test_failed_crawl_resumes_from_checkpoint(livechart, tmp_path, monkeypatch):
+    monkeypatch.setattr(iaea, 'IAEA_RETRIES', 1)
+    monkeypatch.setattr(iaea, '_session', None)
+    livechart.fail('levels', '16O', times=100)
+    assert build(livechart, tmp_path) == [('levels', '16O')]
+    assert livechart.requests[('levels', '16O')] == 2 # One retry by the session, no retries stacked on top
+    assert not (tmp_path / 'bundle.bin').exists()
+
+    livechart.failures.clear()
+    before = livechart.requests.copy()
+    assert build(livechart, tmp_path) == []
+    # Only the failed download is requested again
+    assert livechart.requests - before == collections.Counter({('levels', '16O'): 1})
+    assert open_level_store(str(tmp_path / 'bundle.bin')).levels(8, 8)['jp'].tolist() == ['0+', '2+', '(3/2-)']
@@ -0,0 +1,39 @@
+'''
+Checks that the vectorized iaea_data.process_ground_state gives the same result as the row-wise version it
+replaced (see benchmark_ground_state.py) on the shipped ground state data.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import iaea_data as iaea
+from benchmark_ground_state import raw_ground_state, rowwise_process_ground_state
+
+
+def assert_same_processing(raw):
+    expected = rowwise_process_ground_state(raw.copy())
+    with np.errstate(divide='ignore'): # log10(0) is -inf in both versions
+        result = iaea.process_ground_state(raw.copy())
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_shipped_snapshot():
+    raw = raw_ground_state()
+    # The shipped data covers stable nuclei (no half life in seconds) and unknown half lives
+    assert (raw['half_life'] == 'STABLE').any()
+    assert raw['half_life_sec'].isna().any()
+    assert_same_processing(raw)
+
+@pytest.mark.parametrize('value', [' ', 'STABLE', '?', '0'])
+def test_non_numeric_half_lives(value):
+    # Raw livechart files hold half lives in seconds as text, which can't always be read as a number
+    raw = raw_ground_state()
+    raw['half_life_sec'] = raw['half_life_sec'].astype(object)
+    raw.loc[raw.index[:200:7], 'half_life_sec'] = value
+    raw.loc[raw.index[1:200:11], 'half_life_sec'] = '1e3'
+    assert_same_processing(raw)
+
+def test_unknown_decays_are_kept():
+    raw = raw_ground_state()
+    raw.loc[raw.index[:5], 'decay_1'] = ['IT', ' ', 'NEWMODE', np.nan, 'ECSF']
+    assert_same_processing(raw)
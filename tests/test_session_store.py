@@ -0,0 +1,98 @@
+'''
+Checks SessionStore.get_or_compute on each backend (the redis backend runs on FakeRedis).
+'''
+
+import time
+
+import pandas as pd
+import pytest
+
+import session_store
+from session_store import SessionStore, MemoryBackend, FileSystemBackend, RedisBackend, FakeRedis
+
+TTL = 60
+
+
+class Clock:
+    '''Stand-in for the time module of session_store which can be moved forward'''
+    def __init__(self):
+        self.offset = 0
+
+    def monotonic(self):
+        return time.monotonic() + self.offset
+
+    def time(self):
+        return time.time() + self.offset
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store, 'time', clock)
+    return clock
+
+@pytest.fixture(params=['memory', 'filesystem', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        backend = MemoryBackend(ttl=TTL)
+    elif request.param == 'filesystem':
+        backend = FileSystemBackend(path=str(tmp_path / 'session_store'), ttl=TTL)
+    else:
+        backend = RedisBackend(ttl=TTL, client=FakeRedis())
+    return SessionStore(backend)
+
+
+class Compute:
+    '''Counts the calls of a compute function'''
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_second_call_hits_the_store(store, clock):
+    compute = Compute(pd.DataFrame({'z': [6, 8], 'n': [6, 8]}))
+    first = store.get_or_compute('isotope_levels:12C', compute)
+    second = store.get_or_compute('isotope_levels:12C', compute)
+    assert compute.calls == 1
+    pd.testing.assert_frame_equal(first, compute.value)
+    pd.testing.assert_frame_equal(second, compute.value)
+
+def test_entries_expire(store, clock):
+    compute = Compute('levels')
+    store.get_or_compute('key', compute)
+    clock.offset = TTL - 5
+    store.get_or_compute('key', compute)
+    assert compute.calls == 1
+    clock.offset = TTL + 5
+    assert store.get('key') is None
+    assert store.get_or_compute('key', compute) == 'levels'
+    assert compute.calls == 2
+
+def test_keys_dont_leak_between_sessions(store, clock):
+    first, second = Compute('first session'), Compute('second session')
+    assert store.get_or_compute('session-1:current_data', first) == 'first session'
+    assert store.get_or_compute('session-2:current_data', second) == 'second session'
+    assert store.get_or_compute('session-1:current_data', first) == 'first session'
+    assert (first.calls, second.calls) == (1, 1)
+
+def test_redis_prefixes_dont_share_entries(clock):
+    client = FakeRedis()
+    first = SessionStore(RedisBackend(ttl=TTL, client=client, prefix='app1:'))
+    second = SessionStore(RedisBackend(ttl=TTL, client=client, prefix='app2:'))
+    first.put('key', 'first')
+    assert second.get('key') is None
+    assert second.get_or_compute('key', Compute('second')) == 'second'
+    assert first.get('key') == 'first'
+
+def test_unavailable_backend_computes(clock):
+    class Broken:
+        def get(self, key):
+            raise ConnectionError('down')
+        def set(self, key, value):
+            raise ConnectionError('down')
+    compute = Compute('value')
+    assert SessionStore(Broken()).get_or_compute('key', compute) == 'value'
+    assert compute.calls == 1
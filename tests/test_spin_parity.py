@@ -0,0 +1,68 @@
+'''
+Checks the J^pi parser (spin_parity.py) on the forms used in the IAEA level data.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spin_parity import parse_jp, spin_parity_columns, add_spin_parity, spin_parity_counts, SPIN_PARITY_COLUMNS
+
+
+@pytest.mark.parametrize('jp, expected', [
+    # (two_j, parity, j_tentative, parity_tentative, options)
+    ('0+', (0, 1, False, False, ('0+',))),
+    ('3/2-', (3, -1, False, False, ('3/2-',))),
+    ('(5/2)+', (5, 1, True, False, ('5/2+',))),
+    ('1/2(+)', (1, 1, False, True, ('1/2+',))),
+    ('(2)', (4, 0, True, False, ('2',))),
+    ('7/2', (7, 0, False, False, ('7/2',))),
+    ('(1/2+,3/2+)', (1, 1, True, True, ('1/2+', '3/2+'))),
+    (' 3/2- ', (3, -1, False, False, ('3/2-',))),
+])
+def test_assignments(jp, expected):
+    assert parse_jp(jp) == expected
+
+@pytest.mark.parametrize('jp, options, parity, parityTentative', [
+    # A parity after the list applies to every assignment
+    ('(1/2,3/2)+', ('1/2+', '3/2+'), 1, False),
+    ('(1/2,3/2)(-)', ('1/2-', '3/2-'), -1, True),
+    ('[1,2]-', ('1-', '2-'), -1, False),
+    # An assignment without a sign of its own has an unknown parity
+    ('(3/2+,5/2)', ('3/2+', '5/2'), 1, True),
+    ('(3/2,5/2+)', ('3/2', '5/2+'), 0, False),
+    ('1/2-,3/2', ('1/2-', '3/2'), -1, False),
+])
+def test_lists(jp, options, parity, parityTentative):
+    twoJ, parsedParity, _, parsedTentative, parsedOptions = parse_jp(jp)
+    assert parsedOptions == options
+    assert (parsedParity, parsedTentative) == (parity, parityTentative)
+
+@pytest.mark.parametrize('jp', ['2+ TO 4+', '(3/2:7/2)', '', '+', 'GE 5/2', '1/3+', np.nan, None, 5])
+def test_unknown(jp):
+    assert parse_jp(jp) == (-1, 0, False, False, ())
+
+def test_columns():
+    columns = spin_parity_columns(pd.Series(['3/2-', np.nan, b'(5/2)+', '(1/2,3/2)+', '2+ TO 4+', '3/2-']))
+    assert list(columns) == SPIN_PARITY_COLUMNS
+    assert columns['two_j'].tolist() == [3, -1, 5, 1, -1, 3]
+    np.testing.assert_array_equal(columns['j'], [1.5, np.nan, 2.5, 0.5, np.nan, 1.5])
+    assert columns['parity'].tolist() == [-1, 0, 1, 1, 0, -1]
+    assert columns['j_tentative'].tolist() == [False, False, True, True, False, False]
+    assert columns['tentative'].tolist() == [False, False, True, True, False, False]
+    assert columns['multiple'].tolist() == [False, False, False, True, False, False]
+    assert columns['jp_options'][3] == ('1/2+', '3/2+')
+    assert columns['jp_options'][1] == ()
+
+def test_add_spin_parity_keeps_levels():
+    levels = pd.DataFrame({'energy': [0.0, 100.0], 'jp': ['0+', '2+']}, index=[5, 7])
+    parsed = add_spin_parity(levels)
+    assert 'two_j' not in levels
+    assert parsed.index.tolist() == [5, 7]
+    assert parsed['two_j'].tolist() == [0, 4]
+
+def test_counts():
+    table = spin_parity_counts([0, 4, 4, 3, -1], [1, 1, -1, 0, 1])
+    assert table.index.tolist() == [0.0, 1.5, 2.0]
+    assert table.loc[2.0].tolist() == [1, 1, 0]
+    assert table.loc[1.5].tolist() == [0, 0, 1]